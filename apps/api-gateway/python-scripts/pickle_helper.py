@@ -2,6 +2,22 @@
 """
 Pickle serialization helper for Node.js ZMQ client.
 This script handles conversion between JSON and Python pickle format.
+
+Modes:
+    serialize / deserialize  - one-shot conversion of the whole stdin
+    batch                    - one-shot conversion of a batch body read from stdin
+    stream                   - long-lived daemon answering framed requests
+
+Stream frames (both directions) are a fixed header followed by a body:
+    tag (1 byte) | request id (uint32, big-endian) | body length (uint32, big-endian)
+Request tags are b'S' (JSON -> pickle) and b'D' (pickle -> JSON).
+Response tags are b'O' (body is the result) and b'E' (body is a UTF-8 error message),
+and carry the request id of the frame they answer.
+
+A b'B' request carries a batch body: an item count (uint32) followed by that many
+items of tag (1 byte, b'S' or b'D') | length (uint32) | body. The response body has
+the same layout with b'O'/b'E' item tags, in request order, so a bad item is
+reported in its own slot without failing the rest of the batch.
 """
 
 import sys
@@ -10,22 +26,72 @@ import pickle
 import base64
 import struct
 
+FRAME_HEADER = struct.Struct('>cII')
+BATCH_COUNT = struct.Struct('>I')
+BATCH_ITEM = struct.Struct('>cI')
+
+OP_SERIALIZE = b'S'
+OP_DESERIALIZE = b'D'
+OP_BATCH = b'B'
+STATUS_OK = b'O'
+STATUS_ERROR = b'E'
+
+
+def _serialize(json_bytes):
+    """Convert UTF-8 JSON bytes to pickle bytes."""
+    data = json.loads(json_bytes)
+    return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _deserialize(pickled_data):
+    """Convert pickle bytes to UTF-8 JSON bytes."""
+    data = pickle.loads(pickled_data)
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def _convert(op, body):
+    if op == OP_SERIALIZE:
+        return _serialize(body)
+    if op == OP_DESERIALIZE:
+        return _deserialize(body)
+    raise ValueError(f"Unknown op: {op!r}")
+
+
+def _batch(batch_body):
+    """Convert every item of a batch body, returning the batch response body."""
+    view = memoryview(batch_body)
+    count, = BATCH_COUNT.unpack_from(view, 0)
+    offset = BATCH_COUNT.size
+    out = [BATCH_COUNT.pack(count)]
+    for _ in range(count):
+        op, length = BATCH_ITEM.unpack_from(view, offset)
+        offset += BATCH_ITEM.size
+        if offset + length > len(view):
+            raise ValueError("truncated batch item")
+        body = view[offset:offset + length].tobytes()
+        offset += length
+        try:
+            tag, result = STATUS_OK, _convert(op, body)
+        except Exception as e:
+            tag, result = STATUS_ERROR, str(e).encode('utf-8')
+        out.append(BATCH_ITEM.pack(tag, len(result)))
+        out.append(result)
+    return b''.join(out)
+
+
 def serialize_data():
     """Read JSON from stdin and output pickle bytes to stdout."""
     try:
         # Read JSON data from stdin
         json_data = sys.stdin.read()
-        
-        # Parse JSON to Python object
-        data = json.loads(json_data)
-        
-        # Serialize with pickle
-        pickled = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
-        
+
+        # Parse JSON and serialize with pickle
+        pickled = _serialize(json_data)
+
         # Write binary data to stdout
         sys.stdout.buffer.write(pickled)
         sys.stdout.buffer.flush()
-        
+
     except Exception as e:
         sys.stderr.write(f"Serialization error: {str(e)}\n")
         sys.exit(1)
@@ -35,33 +101,92 @@ def deserialize_data():
     try:
         # Read binary data from stdin
         pickled_data = sys.stdin.buffer.read()
-        
-        # Deserialize with pickle
-        data = pickle.loads(pickled_data)
-        
-        # Convert to JSON and write to stdout
-        json_data = json.dumps(data, ensure_ascii=False)
+
+        # Deserialize with pickle and convert to JSON
+        json_data = _deserialize(pickled_data).decode('utf-8')
         print(json_data)
         sys.stdout.flush()
-        
+
     except Exception as e:
         sys.stderr.write(f"Deserialization error: {str(e)}\n")
         sys.exit(1)
 
+def batch_data():
+    """Read a batch body from stdin and output the batch response body to stdout."""
+    try:
+        response = _batch(sys.stdin.buffer.read())
+        sys.stdout.buffer.write(response)
+        sys.stdout.buffer.flush()
+
+    except Exception as e:
+        sys.stderr.write(f"Batch error: {str(e)}\n")
+        sys.exit(1)
+
+def _read_exact(stream, size):
+    """Read exactly size bytes, or return None on a clean EOF."""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            if remaining == size:
+                return None
+            raise EOFError(f"truncated frame: expected {size} bytes, got {size - remaining}")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+def _write_frame(stream, tag, request_id, body):
+    stream.write(FRAME_HEADER.pack(tag, request_id, len(body)))
+    stream.write(body)
+
+def stream_data():
+    """Serve framed serialize/deserialize requests from stdin until EOF."""
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    handlers = {
+        OP_SERIALIZE: _serialize,
+        OP_DESERIALIZE: _deserialize,
+        OP_BATCH: _batch,
+    }
+
+    while True:
+        header = _read_exact(stdin, FRAME_HEADER.size)
+        if header is None:
+            break
+        op, request_id, length = FRAME_HEADER.unpack(header)
+        body = _read_exact(stdin, length) if length else b''
+        if body is None:
+            raise EOFError("truncated frame: missing body")
+
+        handler = handlers.get(op)
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown op: {op!r}")
+            _write_frame(stdout, STATUS_OK, request_id, handler(body))
+        except Exception as e:
+            # A bad payload only fails its own frame, the daemon keeps serving
+            _write_frame(stdout, STATUS_ERROR, request_id, str(e).encode('utf-8'))
+        stdout.flush()
+
 def main():
     if len(sys.argv) < 2:
-        sys.stderr.write("Usage: pickle_helper.py [serialize|deserialize]\n")
+        sys.stderr.write("Usage: pickle_helper.py [serialize|deserialize|batch|stream]\n")
         sys.exit(1)
-    
+
     mode = sys.argv[1]
-    
+
     if mode == 'serialize':
         serialize_data()
     elif mode == 'deserialize':
         deserialize_data()
+    elif mode == 'batch':
+        batch_data()
+    elif mode == 'stream':
+        stream_data()
     else:
         sys.stderr.write(f"Unknown mode: {mode}\n")
         sys.exit(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
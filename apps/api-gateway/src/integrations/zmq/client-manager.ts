@@ -3,8 +3,8 @@ import { v4 as uuidv4 } from 'uuid';
 import { EventEmitter } from 'events';
 import { Logger } from 'pino';
 import { ZMQProtocolError, ZMQTimeoutError } from '@xiaoy/zmq-protocol';
-import { PythonShell } from 'python-shell';
 import * as path from 'path';
+import { PickleBridge } from './pickle-bridge';
 
 interface ZMQRequest {
   id: string;
@@ -26,6 +26,8 @@ interface ZMQClientConfig {
   pythonPath?: string;
   pythonScriptPath?: string;
   verbose?: boolean;
+  // 'json' talks to RpcWorker natively via the MDP codec frame, skipping the pickle bridge
+  codec?: 'pickle' | 'json';
 }
 
 // Majordomo Protocol constants
@@ -39,6 +41,12 @@ const MDP = {
   W_DISCONNECT: Buffer.from('\x05'),
 };
 
+// RpcWorker wire codec ids (docs/appendices/rpc/mdp/codec.py)
+const CODEC = {
+  PICKLE: Buffer.from('\x01'),
+  JSON: Buffer.from('\x02'),
+};
+
 export class ZMQClientManager extends EventEmitter {
   private client: zmq.Dealer | null = null;
   private requests: Map<string, ZMQRequest> = new Map();
@@ -51,20 +59,30 @@ export class ZMQClientManager extends EventEmitter {
   private logger: Logger;
   private receiveLoop: Promise<void> | null = null;
   private processLoop: Promise<void> | null = null;
+  private pickleBridge: PickleBridge;
 
   constructor(config: ZMQClientConfig, logger: Logger) {
     super();
     this.config = {
       pythonPath: 'python3',
       pythonScriptPath: path.join(__dirname, '../../python-scripts'),
+      codec: 'pickle',
       ...config,
     };
     this.logger = logger.child({ component: 'ZMQClientManager' });
+    this.pickleBridge = new PickleBridge(
+      {
+        pythonPath: this.config.pythonPath!,
+        pythonScriptPath: this.config.pythonScriptPath!,
+      },
+      this.logger
+    );
   }
 
   async start(): Promise<void> {
     try {
       this.active = true;
+      this.pickleBridge.start();
       await this.reconnectToBroker();
       this.startHeartbeat();
       this.startRequestProcessor();
@@ -95,6 +113,8 @@ export class ZMQClientManager extends EventEmitter {
     this.requests.clear();
     this.requestQueue = [];
 
+    this.pickleBridge.stop();
+
     // Stop receive loop
     if (this.receiveLoop) {
       await this.receiveLoop;
@@ -217,11 +237,13 @@ export class ZMQClientManager extends EventEmitter {
 
     // Parse Majordomo protocol message
     // Format: [empty, header, service, requestId, reply_data]
+    // or, with a codec frame: [empty, header, service, requestId, codec, reply_data]
     const empty = msg[0];
     const header = msg[1];
     const service = msg[2];
     const requestId = msg[3].toString();
-    const replyData = msg[4];
+    const codec = msg.length >= 6 ? msg[4] : CODEC.PICKLE;
+    const replyData = msg.length >= 6 ? msg[5] : msg[4];
 
     if (!header.equals(MDP.C_CLIENT)) {
       this.logger.warn({ header: header.toString() }, 'Invalid protocol header');
@@ -236,9 +258,11 @@ export class ZMQClientManager extends EventEmitter {
 
     this.requests.delete(requestId);
 
-    // Deserialize the pickle reply
+    // Deserialize the reply
     try {
-      const result = await this.deserializePickle(replyData);
+      const result = codec.equals(CODEC.JSON)
+        ? JSON.parse(replyData.toString('utf8'))
+        : await this.deserializePickle(replyData);
       
       // The result should be [success, data] based on the Python RpcWorker implementation
       if (Array.isArray(result) && result.length === 2) {
@@ -264,16 +288,18 @@ export class ZMQClientManager extends EventEmitter {
     // Build the request payload following the Python RpcClient format
     // req = [method_name, args, kwargs]
     const requestPayload = [request.method, request.args, request.kwargs];
-    const serializedPayload = await this.serializePickle(requestPayload);
+    const body = this.config.codec === 'json'
+      ? [CODEC.JSON, Buffer.from(JSON.stringify(requestPayload), 'utf8')]
+      : [await this.serializePickle(requestPayload)];
 
     // Build Majordomo protocol message
-    // Format: [empty, header, service, requestId, request_data]
+    // Format: [empty, header, service, requestId, (codec,) request_data]
     const message = [
       Buffer.alloc(0), // empty frame
       MDP.C_CLIENT,
       Buffer.from(request.service),
       Buffer.from(request.id),
-      serializedPayload,
+      ...body,
     ];
 
     // Queue the message
@@ -367,72 +393,22 @@ export class ZMQClientManager extends EventEmitter {
    * Serialize data using Python pickle
    */
   private async serializePickle(data: any): Promise<Buffer> {
-    return new Promise((resolve, reject) => {
-      const options = {
-        mode: 'binary' as any,
-        pythonPath: this.config.pythonPath,
-        pythonOptions: ['-u'],
-        scriptPath: this.config.pythonScriptPath,
-        args: ['serialize'],
-      };
-
-      const pyshell = new PythonShell('pickle_helper.py', options);
-      
-      // Send JSON data to Python
-      pyshell.send(JSON.stringify(data));
-      
-      let result: Buffer | null = null;
-      
-      pyshell.on('message', (message: Buffer) => {
-        result = message;
-      });
-      
-      pyshell.end((err) => {
-        if (err) {
-          reject(new Error(`Pickle serialization failed: ${err.message}`));
-        } else if (result) {
-          resolve(result);
-        } else {
-          reject(new Error('No data received from pickle serialization'));
-        }
-      });
-    });
+    try {
+      return await this.pickleBridge.serialize(data);
+    } catch (error) {
+      throw new Error(`Pickle serialization failed: ${(error as Error).message}`);
+    }
   }
 
   /**
    * Deserialize pickle data using Python
    */
   private async deserializePickle(data: Buffer): Promise<any> {
-    return new Promise((resolve, reject) => {
-      const options = {
-        mode: 'json' as any,
-        pythonPath: this.config.pythonPath,
-        pythonOptions: ['-u'],
-        scriptPath: this.config.pythonScriptPath,
-        args: ['deserialize'],
-      };
-
-      const pyshell = new PythonShell('pickle_helper.py', options);
-      
-      // Send binary data to Python
-      pyshell.send(data as any);
-      
-      let result: any = null;
-      
-      pyshell.on('message', (message: any) => {
-        result = message;
-      });
-      
-      pyshell.end((err) => {
-        if (err) {
-          reject(new Error(`Pickle deserialization failed: ${err.message}`));
-        } else if (result !== null) {
-          resolve(result);
-        } else {
-          reject(new Error('No data received from pickle deserialization'));
-        }
-      });
-    });
+    try {
+      return await this.pickleBridge.deserialize(data);
+    } catch (error) {
+      throw new Error(`Pickle deserialization failed: ${(error as Error).message}`);
+    }
   }
 
   // Public methods for monitoring
@@ -0,0 +1,245 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import { Logger } from 'pino';
+import * as path from 'path';
+
+interface PendingFrame {
+  resolve: (body: Buffer) => void;
+  reject: (error: Error) => void;
+}
+
+interface QueuedItem extends PendingFrame {
+  op: number;
+  body: Buffer;
+}
+
+interface PickleBridgeConfig {
+  pythonPath: string;
+  pythonScriptPath: string;
+}
+
+// Stream framing shared with pickle_helper.py:
+// [tag (1 byte)][request id (uint32 BE)][body length (uint32 BE)][body]
+// Batch bodies: [count (uint32 BE)] then per item [tag (1 byte)][length (uint32 BE)][body]
+const FRAME_HEADER_SIZE = 9;
+const BATCH_ITEM_HEADER_SIZE = 5;
+
+const FRAME = {
+  SERIALIZE: 'S'.charCodeAt(0),
+  DESERIALIZE: 'D'.charCodeAt(0),
+  BATCH: 'B'.charCodeAt(0),
+  OK: 'O'.charCodeAt(0),
+  ERROR: 'E'.charCodeAt(0),
+};
+
+/**
+ * Long-lived connection to `pickle_helper.py stream`.
+ *
+ * A single Python process serves every serialize/deserialize call over its
+ * stdin/stdout pipe, so interpreter startup is paid once instead of per message.
+ * Replies are correlated by request id; the process is respawned on exit.
+ * Calls made in the same event loop turn are coalesced into one batch frame,
+ * so a burst of replies costs a single pipe round trip.
+ */
+export class PickleBridge {
+  private process: ChildProcessWithoutNullStreams | null = null;
+  private pending: Map<number, PendingFrame> = new Map();
+  private outbox: QueuedItem[] = [];
+  private flushScheduled: boolean = false;
+  private buffer: Buffer = Buffer.alloc(0);
+  private nextId: number = 0;
+  private active: boolean = false;
+  private config: PickleBridgeConfig;
+  private logger: Logger;
+
+  constructor(config: PickleBridgeConfig, logger: Logger) {
+    this.config = config;
+    this.logger = logger.child({ component: 'PickleBridge' });
+  }
+
+  start(): void {
+    this.active = true;
+    this.spawnProcess();
+  }
+
+  stop(): void {
+    this.active = false;
+    const error = new Error('Pickle bridge stopped');
+    for (const item of this.outbox.splice(0)) {
+      item.reject(error);
+    }
+    this.rejectPending(error);
+    if (this.process) {
+      this.process.stdin.end();
+      this.process = null;
+    }
+  }
+
+  /**
+   * Serialize a JSON-compatible value to pickle bytes
+   */
+  async serialize(data: any): Promise<Buffer> {
+    return this.request(FRAME.SERIALIZE, Buffer.from(JSON.stringify(data), 'utf8'));
+  }
+
+  /**
+   * Deserialize pickle bytes to a JSON value
+   */
+  async deserialize(data: Buffer): Promise<any> {
+    const body = await this.request(FRAME.DESERIALIZE, data);
+    return JSON.parse(body.toString('utf8'));
+  }
+
+  getPendingCount(): number {
+    return this.pending.size;
+  }
+
+  private request(op: number, body: Buffer): Promise<Buffer> {
+    if (!this.active || !this.process) {
+      return Promise.reject(new Error('Pickle bridge is not running'));
+    }
+
+    return new Promise((resolve, reject) => {
+      this.outbox.push({ op, body, resolve, reject });
+      if (!this.flushScheduled) {
+        this.flushScheduled = true;
+        setImmediate(() => this.flush());
+      }
+    });
+  }
+
+  private flush(): void {
+    this.flushScheduled = false;
+    const items = this.outbox.splice(0);
+    if (items.length === 0) return;
+
+    if (!this.process) {
+      const error = new Error('Pickle bridge is not running');
+      items.forEach(item => item.reject(error));
+      return;
+    }
+
+    if (items.length === 1) {
+      const [item] = items;
+      this.writeFrame(item.op, item.body, item);
+      return;
+    }
+
+    const parts: Buffer[] = [Buffer.alloc(4)];
+    parts[0].writeUInt32BE(items.length, 0);
+    for (const item of items) {
+      const itemHeader = Buffer.alloc(BATCH_ITEM_HEADER_SIZE);
+      itemHeader.writeUInt8(item.op, 0);
+      itemHeader.writeUInt32BE(item.body.length, 1);
+      parts.push(itemHeader, item.body);
+    }
+
+    this.writeFrame(FRAME.BATCH, Buffer.concat(parts), {
+      resolve: (body: Buffer) => this.resolveBatch(items, body),
+      reject: (error: Error) => items.forEach(item => item.reject(error)),
+    });
+  }
+
+  private resolveBatch(items: QueuedItem[], body: Buffer): void {
+    let offset = 4;
+    for (const item of items) {
+      const status = body.readUInt8(offset);
+      const length = body.readUInt32BE(offset + 1);
+      offset += BATCH_ITEM_HEADER_SIZE;
+      const itemBody = body.subarray(offset, offset + length);
+      offset += length;
+
+      if (status === FRAME.OK) {
+        item.resolve(itemBody);
+      } else {
+        item.reject(new Error(itemBody.toString('utf8')));
+      }
+    }
+  }
+
+  private writeFrame(op: number, body: Buffer, frame: PendingFrame): void {
+    const requestId = this.nextId;
+    this.nextId = (this.nextId + 1) >>> 0;
+
+    const header = Buffer.alloc(FRAME_HEADER_SIZE);
+    header.writeUInt8(op, 0);
+    header.writeUInt32BE(requestId, 1);
+    header.writeUInt32BE(body.length, 5);
+
+    this.pending.set(requestId, frame);
+    this.process!.stdin.write(Buffer.concat([header, body]));
+  }
+
+  private spawnProcess(): void {
+    const script = path.join(this.config.pythonScriptPath, 'pickle_helper.py');
+    const child = spawn(this.config.pythonPath, ['-u', script, 'stream']);
+
+    // A write after the helper died emits EPIPE here; unhandled, it would
+    // crash the gateway. 'exit' still follows and respawns the helper.
+    child.stdin.on('error', (error) => {
+      this.logger.error({ error }, 'Pickle helper stdin error');
+      if (this.process === child) {
+        this.rejectPending(new Error(`Pickle helper stdin error: ${error.message}`));
+      }
+    });
+    child.stdout.on('data', (chunk: Buffer) => this.onData(chunk));
+    child.stderr.on('data', (chunk: Buffer) => {
+      this.logger.warn({ stderr: chunk.toString() }, 'Pickle helper stderr');
+    });
+    child.on('error', (error) => {
+      this.logger.error({ error }, 'Pickle helper process error');
+      if (this.process !== child) return;
+      this.rejectPending(new Error(`Pickle helper process error: ${error.message}`));
+      if (child.pid === undefined) {
+        // Spawn failed (e.g. ENOENT): no 'exit' will follow, so stop routing calls to it
+        this.process = null;
+      }
+    });
+    child.on('exit', (code, signal) => {
+      if (this.process !== child) return;
+      this.process = null;
+      this.buffer = Buffer.alloc(0);
+      this.rejectPending(new Error(`Pickle helper exited (code=${code}, signal=${signal})`));
+      if (this.active) {
+        this.logger.warn({ code, signal }, 'Pickle helper exited, respawning');
+        this.spawnProcess();
+      }
+    });
+
+    this.process = child;
+    this.logger.info({ script }, 'Pickle helper started');
+  }
+
+  private onData(chunk: Buffer): void {
+    this.buffer = this.buffer.length ? Buffer.concat([this.buffer, chunk]) : chunk;
+
+    while (this.buffer.length >= FRAME_HEADER_SIZE) {
+      const length = this.buffer.readUInt32BE(5);
+      if (this.buffer.length < FRAME_HEADER_SIZE + length) break;
+
+      const status = this.buffer.readUInt8(0);
+      const requestId = this.buffer.readUInt32BE(1);
+      const body = this.buffer.subarray(FRAME_HEADER_SIZE, FRAME_HEADER_SIZE + length);
+      this.buffer = this.buffer.subarray(FRAME_HEADER_SIZE + length);
+
+      const frame = this.pending.get(requestId);
+      if (!frame) {
+        this.logger.warn({ requestId }, 'Received frame for unknown request');
+        continue;
+      }
+      this.pending.delete(requestId);
+
+      if (status === FRAME.OK) {
+        frame.resolve(Buffer.from(body));
+      } else {
+        frame.reject(new Error(body.toString('utf8')));
+      }
+    }
+  }
+
+  private rejectPending(error: Error): void {
+    for (const frame of this.pending.values()) {
+      frame.reject(error);
+    }
+    this.pending.clear();
+  }
+}
@@ -0,0 +1,301 @@
+"""
+指令解析基准测试
+
+先用各case文件的test_cases校验解析结果，再测量：
+- 单条指令的冷解析延迟（绕过缓存）p50/p99，样本为test_cases和
+  docs/instruction-parsing/test-datasets.json中的指令
+- 合成语料（默认10万条随机生成的指令）的冷解析吞吐，以及重复样本的缓存命中吞吐
+- 每条指令解析的内存峰值字节数（tracemalloc）和残留内存块数（sys.getallocatedblocks）
+
+结果与benchmark_baseline.json比较，任一指标比基线差超过容忍度即返回非零退出码。
+延迟和吞吐与机器快慢、当时负载相关，因此同一进程内还会计时一段与解析代码无关的
+固定参考负载（calibration_us），比较前按本次与基线的参考耗时之比缩放基线的延迟和吞吐。
+缩放只能抵消整体快慢的差异，基线仍应在各自的机器上用--update-baseline生成。
+
+用法:
+    python benchmark.py [--size 100000] [--tolerance 0.25] [--update-baseline]
+"""
+import argparse
+import json
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import clear_case1
+import delta_case1
+import delta_case2
+import delta_case3
+import engine
+import vega_case1
+
+BASELINE_PATH = Path(__file__).with_name('benchmark_baseline.json')
+DATASETS_PATH = Path(__file__).parents[2] / 'instruction-parsing' / 'test-datasets.json'
+
+CASES = [
+    (delta_case1.test_cases, delta_case1.parse_single_side_delta_instructions),
+    (delta_case2.test_cases, delta_case2.parse_dual_side_delta_instructions),
+    (delta_case3.test_cases, delta_case3.parse_fixed_strike_delta_instructions),
+    (vega_case1.test_cases, vega_case1.parse_vega_instructions),
+    (clear_case1.test_cases, clear_case1.parse_clear_strike_option_instructions),
+]
+
+# 指标方向：True表示越小越好
+METRICS = {
+    'latency_p50_us': True,
+    'latency_p99_us': True,
+    'throughput_cold_per_s': False,
+    'throughput_cached_per_s': False,
+    'peak_bytes_per_parse': True,
+    'retained_blocks_per_parse': True,
+}
+# 随机器快慢变化、按参考负载耗时缩放的指标
+TIMED_METRICS = {'latency_p50_us', 'latency_p99_us', 'throughput_cold_per_s', 'throughput_cached_per_s'}
+
+CALIBRATION_TEXT = "沪500 深500 当月和下月 买 万1 0.5 5.5c 平20% 的d " * 4
+CALIBRATION_RE = re.compile(r'(\d+(?:\.\d*)?)([千万%cp]?)')
+CALIBRATION_RUNS = 15
+
+TARGETS = ['沪500', '沪300', '沪50', '科创50', '科创80', '深500', '深300', '深100', '创业板', '500', '300', '50', 'IH', 'IF', 'IC', 'IM']
+MONTHS = ['当月', '下月', '下季', '隔季']
+UNITS = ['万', '千']
+
+
+def check_cases():
+    """
+    校验test_cases，返回失败的指令列表
+    """
+    failures = []
+    for test_cases, func in CASES:
+        for instruction, expected in test_cases.items():
+            if func(instruction) != expected:
+                failures.append(instruction)
+    return failures
+
+
+def fixture_instructions():
+    """
+    test_cases和test-datasets.json中的全部指令
+    """
+    instructions = [instruction for test_cases, _ in CASES for instruction in test_cases]
+    if DATASETS_PATH.exists():
+        datasets = json.loads(DATASETS_PATH.read_text(encoding='utf-8'))
+        for section in datasets.values():
+            if isinstance(section, dict):
+                for name in ('originalTestCases', 'additionalEdgeCases'):
+                    instructions.extend(section.get(name, {}))
+    return instructions
+
+
+def generate_corpus(size, seed=0):
+    """
+    随机生成size条五种类型的指令
+    """
+    rng = random.Random(seed)
+
+    def amount():
+        return str(rng.choice([0.1, 0.2, 0.3, 0.5, 1, 1.5, 2, 3]))
+
+    def strike():
+        return f"{rng.choice([0.8, 0.85, 2.5, 3.6, 5.5, 2450])}{rng.choice('cp')}"
+
+    corpus = []
+    for _ in range(size):
+        targets = ' '.join(rng.sample(TARGETS, rng.randint(1, 2)))
+        month = rng.choice(MONTHS)
+        exposure = rng.choice(UNITS) + amount()
+        kind = rng.randrange(5)
+        if kind == 0:
+            corpus.append(f"{targets} {rng.choice(['买', '卖出'])} {month} {exposure} 的{rng.choice('cp')}")
+        elif kind == 1:
+            corpus.append(f"{targets} 有买有卖 {month} {rng.choice(['调正', '调负'])} {exposure} 的d")
+        elif kind == 2:
+            corpus.append(f"{targets} {rng.choice(['买', '卖'])} {strike()} {month} {exposure} 的d")
+        elif kind == 3:
+            corpus.append(f"{rng.choice(['双买', '双卖'])} {targets} {month} {exposure} 的v")
+        else:
+            corpus.append(f"{targets} {strike()} {month} 平{rng.choice([20, 50, 100])}%")
+    return corpus
+
+
+def parse_cold(instruction):
+    """
+    绕过缓存解析一条指令，解析失败的指令同样计时
+    """
+    try:
+        [leg.format() for leg in engine.build_legs(engine.normalize(instruction))]
+    except Exception:  # noqa
+        pass
+
+
+def calibration_workload():
+    """
+    固定的参考负载：正则、字符串和字典操作，与解析代码无关
+    """
+    counts = {}
+    for _ in range(100):
+        for match in CALIBRATION_RE.finditer(CALIBRATION_TEXT):
+            counts[match.group(2)] = counts.get(match.group(2), 0) + len(match.group(1))
+        sorted(CALIBRATION_TEXT.split())
+    return counts
+
+
+def calibrate():
+    """
+    参考负载单次耗时的中位数（微秒）
+    """
+    samples = []
+    for _ in range(CALIBRATION_RUNS):
+        start = time.perf_counter_ns()
+        calibration_workload()
+        samples.append(time.perf_counter_ns() - start)
+    return statistics.median(samples) / 1e3
+
+
+def measure_latency(instructions, rounds):
+    samples = []
+    for _ in range(rounds):
+        for instruction in instructions:
+            start = time.perf_counter_ns()
+            parse_cold(instruction)
+            samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return samples[len(samples) // 2] / 1e3, samples[int(len(samples) * 0.99)] / 1e3
+
+
+def measure_throughput(corpus, fixtures):
+    """
+    冷解析吞吐用合成语料；缓存命中吞吐用重复发送的样本指令，模拟全天重发的指令
+    """
+    start = time.perf_counter()
+    for instruction in corpus:
+        parse_cold(instruction)
+    cold = len(corpus) / (time.perf_counter() - start)
+
+    repeated = fixtures * max(1, len(corpus) // len(fixtures))
+    engine._parse.cache_clear()
+    engine._parse_legs.cache_clear()
+    start = time.perf_counter()
+    for instruction in repeated:
+        engine.parse_line(0, instruction)
+    cached = len(repeated) / (time.perf_counter() - start)
+    return cold, cached
+
+
+def measure_memory(instructions):
+    """
+    每条指令解析的平均内存峰值（字节）和残留内存块数，不是分配次数
+    """
+    peaks = 0
+    tracemalloc.start()
+    for instruction in instructions:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        parse_cold(instruction)
+        peaks += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    blocks = sys.getallocatedblocks()
+    for instruction in instructions:
+        parse_cold(instruction)
+    retained = sys.getallocatedblocks() - blocks
+    return peaks / len(instructions), retained / len(instructions)
+
+
+def run(size, rounds):
+    fixtures = fixture_instructions()
+    corpus = generate_corpus(size)
+
+    # 预热，编译正则、导入模块
+    for instruction in fixtures:
+        parse_cold(instruction)
+
+    # 参考负载在测量前后各计时一次，取两者的平均
+    calibration = calibrate()
+    p50, p99 = measure_latency(fixtures, rounds)
+    cold, cached = measure_throughput(corpus, fixtures)
+    calibration = (calibration + calibrate()) / 2
+    peak, retained = measure_memory(fixtures)
+    return {
+        'latency_p50_us': round(p50, 2),
+        'latency_p99_us': round(p99, 2),
+        'throughput_cold_per_s': round(cold),
+        'throughput_cached_per_s': round(cached),
+        'peak_bytes_per_parse': round(peak),
+        'retained_blocks_per_parse': round(retained, 3),
+        'calibration_us': round(calibration, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    与基线比较，返回退化的指标说明列表
+
+    基线记录了calibration_us时，延迟和吞吐的基线按本次参考耗时与基线参考耗时之比缩放。
+    """
+    scale = results['calibration_us'] / baseline['calibration_us'] if baseline.get('calibration_us') else 1.0
+    regressions = []
+    for name, lower_is_better in METRICS.items():
+        if name not in baseline:
+            continue
+        value, base = results[name], baseline[name]
+        if name in TIMED_METRICS:
+            base = round(base * scale if lower_is_better else base / scale, 2)
+        if lower_is_better:
+            # 残留内存块数基线可能为0，至少允许1个块的波动
+            limit = max(base * (1 + tolerance), base + 1) if name == 'retained_blocks_per_parse' else base * (1 + tolerance)
+            worse = value > limit
+        else:
+            worse = value < base * (1 - tolerance)
+        if worse:
+            regressions.append(f"{name}: {value} vs baseline {base}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100_000, help="合成语料的指令条数")
+    parser.add_argument('--rounds', type=int, default=20, help="延迟测试对样本重复的轮数")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="相对基线允许的退化比例")
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help="把本次结果写为新的基线")
+    args = parser.parse_args()
+
+    failures = check_cases()
+    if failures:
+        print(f"Parse results changed for {len(failures)} test cases: {failures}")
+        return 1
+
+    results = run(args.size, args.rounds)
+    for name, value in results.items():
+        print(f"{name:28s} {value}")
+
+    if args.update_baseline:
+        baseline = dict(
+            results, size=args.size, rounds=args.rounds, python=platform.python_version(), machine=platform.machine()
+        )
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n", encoding='utf-8')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --update-baseline to create one")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+    if (baseline.get('size'), baseline.get('rounds')) != (args.size, args.rounds):
+        print(f"Note: baseline was taken with --size {baseline.get('size')} --rounds {baseline.get('rounds')}")
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
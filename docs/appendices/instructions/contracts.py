@@ -0,0 +1,195 @@
+"""
+合约月份解析
+
+把解析结果中的相对月份（当月/下月/下季/隔季）解析为具体的合约月份。
+到期规则由符号表中标的的calendar配置决定：
+- etf: ETF期权，到期月第四个星期三
+- index: 股指期权，到期月第三个星期五
+到期日遇节假日顺延至下一交易日。到期日当天仍算当月，之后当月滚动到下一个月。
+下季、隔季为下月之后的第一个、第二个季月（3、6、9、12月）。
+
+ContractCalendar在构造时为区间内每个标的的每一天预先算好四个合约月份，
+查询只是一次字典查找。节假日来自holidays.json（交易所休市的工作日），需按交易所
+每年公布的休市安排维护。
+
+用法:
+    calendar = ContractCalendar(date(2024, 1, 1), date(2025, 12, 31))
+    calendar.resolve('沪50', '下季', date(2024, 6, 3)).code  # "5100502409"
+"""
+import json
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+import lexer
+from symbols import SymbolTable
+
+HOLIDAYS_PATH = Path(__file__).with_name('holidays.json')
+
+MONTH_LABELS = {'当月': 0, '下月': 1, '下季': 2, '隔季': 3}
+QUARTER_MONTHS = (3, 6, 9, 12)
+
+# 到期规则：(星期几, 第几个)，星期一为0
+EXPIRY_RULES = {
+    'etf': (2, 4),  # 第四个星期三
+    'index': (4, 3),  # 第三个星期五
+}
+
+
+class ContractMonth(NamedTuple):
+    underlying: str  # 标的，如"沪50"
+    product: str  # 期权品种代码，如"510050"、"IO"
+    year: int
+    month: int
+    expiry: date  # 到期日
+
+    @property
+    def yymm(self) -> str:
+        return f"{self.year % 100:02d}{self.month:02d}"
+
+    @property
+    def code(self) -> str:
+        return f"{self.product}{self.yymm}"
+
+
+def load_holidays(path: str | Path = HOLIDAYS_PATH) -> List[date]:
+    with open(path, encoding='utf-8') as f:
+        return [date.fromisoformat(day) for day in json.load(f)]
+
+
+def add_months(year: int, month: int, months: int) -> Tuple[int, int]:
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def next_quarter(year: int, month: int) -> Tuple[int, int]:
+    """
+    严格晚于给定月份的第一个季月
+    """
+    year, month = add_months(year, month, 1)
+    while month not in QUARTER_MONTHS:
+        year, month = add_months(year, month, 1)
+    return year, month
+
+
+class ContractCalendar:
+    def __init__(
+            self,
+            start: date,
+            end: date,
+            holidays: Iterable[date] = None,
+            table: SymbolTable = None
+    ):
+        """
+        预先计算start到end（含）每一天各标的的合约月份
+
+        holidays缺省读取holidays.json，table缺省为当前的标的符号表。
+        """
+        self.start = start
+        self.end = end
+        self.holidays = frozenset(load_holidays() if holidays is None else holidays)
+        self.table = table or lexer.symbols
+        self.expiries: Dict[Tuple[str, int, int], date] = {}  # (calendar, 年, 月) -> 到期日
+        self.index: Dict[str, Dict[date, Tuple[ContractMonth, ...]]] = {}  # 标的 -> 日期 -> 四个合约月份
+
+        by_calendar: Dict[str, Dict[date, Tuple[Tuple[int, int], ...]]] = {}
+        for name, spec in self.table.specs.items():
+            calendar = spec.get('calendar')
+            if calendar is None:
+                continue
+            if calendar not in by_calendar:
+                by_calendar[calendar] = self.build_months(calendar)
+
+            # 同一合约月份在各天之间共用一个ContractMonth
+            contracts: Dict[Tuple[int, int], ContractMonth] = {}
+            for months in by_calendar[calendar].values():
+                for year, month in months:
+                    if (year, month) not in contracts:
+                        contracts[year, month] = ContractMonth(
+                            name, spec['product'], year, month, self.expiry(calendar, year, month)
+                        )
+            self.index[name] = {
+                day: tuple(contracts[ym] for ym in months) for day, months in by_calendar[calendar].items()
+            }
+
+    def is_trading_day(self, day: date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays
+
+    def expiry(self, calendar: str, year: int, month: int) -> date:
+        """
+        到期日，遇非交易日顺延
+        """
+        key = (calendar, year, month)
+        if key not in self.expiries:
+            weekday, nth = EXPIRY_RULES[calendar]
+            first = date(year, month, 1)
+            day = first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (nth - 1))
+            while not self.is_trading_day(day):
+                day += timedelta(days=1)
+            self.expiries[key] = day
+        return self.expiries[key]
+
+    def build_months(self, calendar: str) -> Dict[date, Tuple[Tuple[int, int], ...]]:
+        """
+        某一到期规则下每一天的 (当月, 下月, 下季, 隔季) 年月
+        """
+        months = {}
+        day = self.start
+        while day <= self.end:
+            front = (day.year, day.month)
+            if day > self.expiry(calendar, *front):
+                front = add_months(*front, 1)
+            second = add_months(*front, 1)
+            third = next_quarter(*second)
+            months[day] = (front, second, third, next_quarter(*third))
+            day += timedelta(days=1)
+        return months
+
+    def resolve(self, underlying: str, label: str, day: date) -> ContractMonth:
+        """
+        相对月份解析为合约月份
+
+        标的没有期权或日期不在预计算区间内时抛出KeyError。
+        """
+        try:
+            return self.index[underlying][day][MONTH_LABELS[label]]
+        except KeyError:
+            raise KeyError(f"No contract month for {underlying} {label} on {day}") from None
+
+    def resolve_legs(self, legs: Iterable, day: date) -> List[ContractMonth]:
+        """
+        为engine.Leg列表逐条解析合约月份
+        """
+        return [self.resolve(leg.underlying, leg.month, day) for leg in legs]
+
+
+test_cases = {
+    ('沪50', '当月', date(2024, 6, 3)): '5100502406',
+    ('沪50', '下月', date(2024, 6, 3)): '5100502407',
+    ('沪50', '下季', date(2024, 6, 3)): '5100502409',
+    ('沪50', '隔季', date(2024, 6, 3)): '5100502412',
+    # 6月26日为第四个星期三，到期日当天仍为当月
+    ('沪500', '当月', date(2024, 6, 26)): '5105002406',
+    ('沪500', '当月', date(2024, 6, 27)): '5105002407',
+    ('沪500', '下季', date(2024, 6, 27)): '5105002409',
+    ('创业板', '隔季', date(2024, 8, 29)): '1599152503',
+    # 2024年2月第三个星期五为春节休市，到期日顺延至2月19日
+    ('IF', '当月', date(2024, 2, 19)): 'IO2402',
+    ('IF', '当月', date(2024, 2, 20)): 'IO2403',
+    ('IM', '下季', date(2024, 11, 18)): 'MO2503',
+    ('IH', '隔季', date(2024, 12, 23)): 'HO2506',
+}
+
+
+def test_resolve_contract_months():
+    calendar = ContractCalendar(date(2024, 1, 1), date(2025, 12, 31))
+    for (underlying, label, day), expected in test_cases.items():
+        result = calendar.resolve(underlying, label, day).code
+        assert result == expected, f"Failed on {underlying} {label} {day}: {result} != {expected}"
+        print(f"Passed on {underlying} {label} {day}: {result} == {expected}")
+
+    print("All test cases passed!")
+
+
+if __name__ == "__main__":
+    test_resolve_contract_months()
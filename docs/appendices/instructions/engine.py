@@ -0,0 +1,392 @@
+"""
+指令解析引擎
+
+五类交易指令（单边delta、双边delta、固定行权价delta、vega、平仓）共用一套模块级的
+标的符号表（见symbols.py）和展开规则：先对指令做规范化并切分为记号流（见lexer.py），据此判断指令类型，
+再按类型从记号中取出动作、标的、月份、敞口和期权，最后按统一的展开规则生成每一条腿（Leg）。
+parse_legs返回结构化的Leg，parse把Leg格式化为原有的字符串。
+解析结果按规范化后的文本缓存，重复发送的指令无需重新解析。
+parse_many逐行解析聊天导出或回放文件，可选多进程并行，单行错误随结果返回。
+"""
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from functools import lru_cache
+from itertools import islice, repeat
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import lexer
+from lexer import ACTION, ADJUST, CLOSE, EACH, EXPOSURE, MONTH, OPTION, PERCENT, STRIKE, TARGET, tokenize
+from symbols import SymbolTable
+
+# 指令类型
+DELTA = 'delta'  # 单边delta，如"500 买 下月 万1 的c"
+DUAL_DELTA = 'dual_delta'  # 双边delta，如"500 有买有卖 调正万1 的d"
+STRIKE_DELTA = 'strike_delta'  # 固定行权价delta，如"500 买 5.5c 万0.2 的d"
+VEGA = 'vega'  # vega，如"双买 500 下月 万1 的v"
+CLEAR = 'clear'  # 平仓，如"500 5.5c 平20%"
+
+DEFAULT_MONTH = '当月'
+
+ACTION_MAPPING = {'买入': '买', '卖出': '卖'}
+
+VEGA_ACTIONS = {'双买', '双卖'}
+DUAL_ACTIONS = {'有买有卖', '有卖有买'}
+SPACE_RE = re.compile(r'\s+')
+
+
+def get_target_mapping(target, return_num: int = 1):
+    return lexer.symbols.expand(target, return_num)
+
+
+def load_symbols(table: SymbolTable | str = None) -> None:
+    """
+    替换标的符号表，table可以是SymbolTable或配置文件路径，缺省重新加载symbols.json
+
+    会清空解析缓存。
+    """
+    if not isinstance(table, SymbolTable):
+        table = SymbolTable.load(table) if table else SymbolTable.load()
+    lexer.symbols = table
+    _parse.cache_clear()
+    _parse_legs.cache_clear()
+
+
+def values(tokens, token_type):
+    return [token.value for token in tokens if token.type == token_type]
+
+
+def find_strikes(tokens):
+    """
+    行权价记号转为期权，如"0.85p"转为"put-0.85"
+    """
+    option_symbols = [('call-' if strike[-1] == 'c' else 'put-') + strike[:-1] for strike in values(tokens, STRIKE)]
+    if len(option_symbols) < 1:
+        raise ValueError(f"Strick should have least one element: {option_symbols}")
+    return option_symbols
+
+
+def normalize(instruction):
+    """
+    规范化指令文本：全角字符转半角，连续空白合并为一个空格
+    """
+    return SPACE_RE.sub(' ', unicodedata.normalize('NFKC', instruction)).strip()
+
+
+def classify(tokens):
+    """
+    根据记号判断指令类型，按 vega > 双边delta > 平仓 > 固定行权价delta > 单边delta 的优先级
+    """
+    types = {token.type for token in tokens}
+    actions = set(values(tokens, ACTION))
+    if actions & VEGA_ACTIONS:
+        return VEGA
+    if actions & DUAL_ACTIONS or ADJUST in types:
+        return DUAL_DELTA
+    if CLOSE in types:
+        return CLEAR
+    if STRIKE in types:
+        return STRIKE_DELTA
+    return DELTA
+
+
+def extract(tokens, kind):
+    """
+    按指令类型从记号中取出 (动作, 标的, 月份, 敞口, 期权, 是否"各")
+    """
+    actions = values(tokens, ACTION)
+    options = values(tokens, OPTION)
+    exposures = values(tokens, EXPOSURE)
+    if kind in (DELTA, STRIKE_DELTA):
+        actions = [action for action in actions if action not in VEGA_ACTIONS | DUAL_ACTIONS]
+        if not actions:
+            raise ValueError(f"Instruction should contain an action: {tokens}")
+        action = ACTION_MAPPING.get(actions[0], actions[0])
+        if kind == DELTA:
+            # 按位置取最后一个c/p标记，指令中其他位置的字母不影响方向
+            sides = [option for option in options if option in ('c', 'p')]
+            option_symbols = ['call' if sides and sides[-1] == 'c' else 'put']
+        else:
+            option_symbols = find_strikes(tokens)
+    elif kind == DUAL_DELTA:
+        action = ''
+        adjusts = values(tokens, ADJUST)
+        option_type = ""
+        if '调正' in adjusts:
+            option_type = 'call'
+        if '调负' in adjusts:
+            option_type = 'put'
+        if option_type not in ['call', 'put']:
+            raise ValueError(f"Option type should be either 'call' or 'put': {tokens}")
+        option_symbols = [option_type]
+    elif kind == VEGA:
+        actions = [action for action in actions if action in VEGA_ACTIONS]
+        if not actions:
+            raise ValueError(f"Instruction should contain '双买' or '双卖': {tokens}")
+        action = actions[0]
+        if 'v' not in options:
+            raise ValueError(f"Instruction should contain 'v': {tokens}")
+        option_symbols = ['vega']
+    elif kind == CLEAR:
+        action = "平"
+        option_symbols = find_strikes(tokens)
+        exposures = values(tokens, PERCENT)
+        if not exposures and any(token.type == CLOSE for token in tokens):
+            exposures = ["100%"]
+    else:
+        raise ValueError(f"Unknown instruction kind: {kind}")
+
+    if not exposures:
+        raise ValueError(f"Instruction should contain an exposure: {tokens}")
+    targets = [lexer.symbols.resolve(target) for target in values(tokens, TARGET)]
+    if not targets:
+        raise ValueError(f"Instruction should contain a target: {tokens}")
+    months = values(tokens, MONTH)
+    return action, targets, months, exposures, option_symbols, any(token.type == EACH for token in tokens)
+
+
+def expand(targets, months, exposures, option_symbols, each, strict_each=False):
+    """
+    展开为 (标的, 月份, 敞口, 期权) 的列表
+
+    strict_each: "各"指令要求一个标的、一个敞口和多个月份
+    """
+    legs = []
+    if len(option_symbols) > 1:
+        # 多个option_symbol,只处理一个target,一个月份
+        targets = [get_target_mapping(target, 1)[0] for target in targets]
+        if len(targets) != 1:
+            raise ValueError(f"Targets should have only one element: {targets}")
+        if len(months) == 0:
+            months = [DEFAULT_MONTH]
+        if len(months) != 1:
+            raise ValueError(f"Months should have only one element: {months}")
+        if len(exposures) == len(option_symbols):
+            for option_symbol, exposure in zip(option_symbols, exposures):
+                legs.append((targets[0], months[0], exposure, option_symbol))
+        else:
+            if len(exposures) != 1:
+                raise ValueError(f"Exposures should have only one element: {exposures}")
+            for option_symbol in option_symbols:
+                legs.append((targets[0], months[0], exposures[0], option_symbol))
+        return legs
+
+    option_symbol = option_symbols[0]
+    if each:
+        if strict_each and len(targets) != 1:
+            raise ValueError(f"Targets should have only one element: {targets}")
+        if len(exposures) != 1:
+            raise ValueError(f"Exposures should have only one element: {exposures}")
+        if strict_each and len(months) <= 1:
+            raise ValueError(f"Months should have more than one element: {months}")
+        for target in targets:
+            for month in months:
+                target = get_target_mapping(target, 1)[0]
+                legs.append((target, month, exposures[0], option_symbol))
+        return legs
+
+    if len(months) == 0:
+        months = [DEFAULT_MONTH]
+
+    # 一个月份，一个敞口，一个标的
+    if len(months) == len(exposures) == 1:
+        targets = [get_target_mapping(target, 1)[0] for target in targets]
+        for target in targets:
+            legs.append((target, months[0], exposures[0], option_symbol))
+    elif len(months) == 1:
+        # 一个月份，标的数量和敞口相等，则一一对应，如果标的在target_mapping中，则使用对应的带沪标的
+        if len(targets) == len(exposures):
+            targets = [get_target_mapping(target, 1)[0] for target in targets]
+            for target, exposure in zip(targets, exposures):
+                legs.append((target, months[0], exposure, option_symbol))
+
+        if len(targets) < len(exposures):
+            # 一个月份，标的数量比敞口数量少，说明标的中有300,500，需要拆分
+            new_targets = []
+            for target in targets:
+                new_targets.extend(get_target_mapping(target, 2))
+            if len(new_targets) != len(exposures):
+                raise ValueError(f"Targets and exposures should have the same length: {new_targets} vs {exposures}")
+            for target, exposure in zip(new_targets, exposures):
+                legs.append((target, months[0], exposure, option_symbol))
+    elif len(months) > 1:
+        if len(targets) != 1:
+            raise ValueError(f"Targets should have only one element: {targets}")
+        targets = [get_target_mapping(target, 1)[0] for target in targets]
+        for month, exposure in zip(months, exposures):
+            legs.append((targets[0], month, exposure, option_symbol))
+    return legs
+
+
+class Leg:
+    """
+    解析出的一条腿
+
+    数值字段用Decimal保存，既可直接参与计算，又能原样还原指令中的写法。
+    缓存的解析结果在调用之间共享，不要修改其字段。
+    """
+    __slots__ = ('kind', 'underlying', 'month', 'unit', 'value', 'side', 'option_type', 'strike', 'close_pct')
+
+    def __init__(self, kind, underlying, month, unit, value, side, option_type, strike=None, close_pct=None):
+        self.kind = kind  # 指令类型
+        self.underlying = underlying  # 标的，如"沪500"
+        self.month = month  # 月份，如"当月"
+        self.unit = unit  # 敞口单位：万/千/份，平仓为None
+        self.value = value  # 敞口数值，平仓为None
+        self.side = side  # 方向：买/卖/双买/双卖/平，双边delta为空
+        self.option_type = option_type  # call/put/vega
+        self.strike = strike  # 行权价，未指定为None
+        self.close_pct = close_pct  # 平仓比例，如20表示20%
+
+    @classmethod
+    def from_parts(cls, kind, action, target, month, exposure, option_symbol):
+        """
+        由展开后的 (标的, 月份, 敞口, 期权) 文本构造
+        """
+        option_type, _, strike = option_symbol.partition('-')
+        strike = Decimal(strike) if strike else None
+        if kind == CLEAR:
+            return cls(kind, target, month, None, None, action, option_type, strike, Decimal(exposure[:-1]))
+        return cls(kind, target, month, exposure[0], Decimal(exposure[1:]), action, option_type, strike)
+
+    def as_tuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, Leg) and self.as_tuple() == other.as_tuple()
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"Leg({fields})"
+
+    def format(self):
+        """
+        按指令类型输出原有的字符串格式
+        """
+        option_symbol = self.option_type if self.strike is None else f"{self.option_type}-{self.strike}"
+        if self.kind == CLEAR:
+            return f"{self.underlying} {self.month} {option_symbol} {self.side}{self.close_pct}%"
+        exposure = f"{self.unit}{self.value}"
+        if self.kind == DUAL_DELTA:
+            return f"{self.underlying} {self.month} {exposure} {option_symbol}"
+        if self.kind == STRIKE_DELTA:
+            return f"{self.underlying} {self.month} {exposure} {self.side} {option_symbol}"
+        return f"{self.underlying} {self.month} {exposure} {self.side}{option_symbol}"
+
+
+def build_legs(instruction, kind=None):
+    """
+    解析一条已规范化的指令，不经过缓存
+    """
+    tokens = tokenize(instruction)
+    if kind is None:
+        kind = classify(tokens)
+    if kind == CLEAR and '%' in instruction and PERCENT not in {token.type for token in tokens}:
+        # 写了百分比却没有识别出来，不能按平100%处理
+        raise ValueError(f"Unrecognized close percentage: {instruction}")
+    action, targets, months, exposures, option_symbols, each = extract(tokens, kind)
+    legs = expand(targets, months, exposures, option_symbols, each, strict_each=kind == DUAL_DELTA)
+    if not legs:
+        raise ValueError(f"Instruction should produce at least one leg: {instruction}")
+    return tuple(Leg.from_parts(kind, action, *leg) for leg in legs)
+
+
+@lru_cache(maxsize=4096)
+def _parse_legs(instruction, kind):
+    return build_legs(instruction, kind)
+
+
+@lru_cache(maxsize=4096)
+def _parse(instruction, kind):
+    return tuple(leg.format() for leg in _parse_legs(instruction, kind))
+
+
+def parse(instruction, kind=None):
+    """
+    解析一条指令，返回原有格式的字符串列表，kind为空时自动判断指令类型
+    """
+    return list(_parse(normalize(instruction), kind))
+
+
+def parse_legs(instruction, kind=None):
+    """
+    解析一条指令，返回Leg列表，kind为空时自动判断指令类型
+    """
+    return list(_parse_legs(normalize(instruction), kind))
+
+
+class ParseResult(NamedTuple):
+    line: int  # 行号，从1开始
+    instruction: str
+    results: list  # 原有格式的字符串，records为True时为Leg
+    error: Optional[str]  # 解析失败时的错误信息，成功时为None
+
+
+def parse_line(line, instruction, kind=None, records=False):
+    """
+    解析一条指令，异常转为ParseResult.error而不抛出
+    """
+    try:
+        results = parse_legs(instruction, kind) if records else parse(instruction, kind)
+        return ParseResult(line, instruction, results, None)
+    except Exception as e:  # noqa
+        return ParseResult(line, instruction, [], f"{type(e).__name__}: {e}")
+
+
+def parse_many(
+        instructions: Iterable[str] | str,
+        kind=None,
+        processes: int = 0,
+        chunksize: int = 256,
+        records: bool = False
+) -> Iterator[ParseResult]:
+    """
+    逐行解析多条指令，按输入顺序生成ParseResult
+
+    instructions可以是按行分隔的文本、打开的文件或任意字符串迭代器，空行会被跳过，
+    单行解析失败不影响其余各行。processes大于0时用该数量的进程并行解析，每次只从
+    输入中取出有限的一批，适合回放整天的聊天记录。records为True时结果为Leg而非字符串。
+    """
+    if isinstance(instructions, str):
+        instructions = instructions.splitlines()
+    lines = ((line, text.strip()) for line, text in enumerate(instructions, 1) if text.strip())
+
+    if processes <= 0:
+        for line, instruction in lines:
+            yield parse_line(line, instruction, kind, records)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        while True:
+            batch = list(islice(lines, chunksize * processes * 4))
+            if not batch:
+                break
+            numbers, texts = zip(*batch)
+            yield from pool.map(parse_line, numbers, texts, repeat(kind), repeat(records), chunksize=chunksize)
+
+
+# 应返回错误而不是结果的指令
+error_cases = [
+    "有买有卖 500 万1 的d",  # 缺少调正/调负
+    "创业板 买 万1 0.5 的c",  # 敞口多于标的
+    "1500 买 万1 的c",  # 没有可识别的标的
+    "500 万1 的c",  # 缺少动作
+    "500 5.5c 平 % 20",  # 无法识别的平仓比例
+]
+
+
+def test_parse_errors():
+    for line, instruction in enumerate(error_cases, 1):
+        result = parse_line(line, instruction)
+        assert result.error is not None and not result.results, f"Failed on {instruction}: {result}"
+        print(f"Passed on {instruction}: {result.error}")
+
+    print("All test cases passed!")
+
+
+if __name__ == "__main__":
+    test_parse_errors()
@@ -0,0 +1,98 @@
+"""
+指令词法分析
+
+一次扫描把指令切分为带位置的类型化记号，解析器只消费记号流，不再对原始字符串
+反复做正则匹配。标的由符号表（见symbols.py）的前缀树按最长匹配识别。数字按从左到右的位置只归属一个记号：行权价"0.85p"、百分比
+"20%"、敞口"万1 0.5"中的数字不会再被当作标的"50"/"500"，孤立的"c"/"p"等
+字母也只在不属于其他记号时才作为期权类型。
+"""
+import re
+from typing import List, NamedTuple
+
+from symbols import SymbolTable
+
+# 记号类型
+ACTION = 'ACTION'  # 买/卖/买入/卖出/双买/双卖/有买有卖/有卖有买
+TARGET = 'TARGET'  # 标的，如"沪500"、"500"、"IH"
+MONTH = 'MONTH'  # 当月/下月/下季/隔季
+EXPOSURE = 'EXPOSURE'  # 敞口，每个数值一个记号，如"万1"、"份0.5"
+STRIKE = 'STRIKE'  # 行权价和期权类型，如"0.85p"
+PERCENT = 'PERCENT'  # 平仓比例，如"20%"，"20 %"的值同样为"20%"
+EACH = 'EACH'  # 各
+ADJUST = 'ADJUST'  # 调正/调负
+CLOSE = 'CLOSE'  # 平/清
+OPTION = 'OPTION'  # 期权类型标记 c/p/d/v，前后紧挨字母时（如"ic"）不算
+NUMBER = 'NUMBER'  # 不属于以上任何记号的数字
+
+NUM = r'\d+(?:\.\d*)?'
+# 在同一位置按 行权价/百分比/敞口 > 标的 > 其他记号 的优先级匹配
+LEAD_RE = re.compile(
+    rf'(?P<STRIKE>{NUM}[cp])'
+    rf'|(?P<PERCENT>{NUM}\s*%)'
+    rf'|(?P<EXPOSURE>[千万]\s*{NUM}(?:\s+{NUM})*|{NUM}(?:\s+{NUM})*\s*份)'
+)
+TAIL_RE = re.compile(
+    rf'(?P<NUMBER>{NUM})'
+    r'|(?P<MONTH>当月|下月|下季|隔季)'
+    r'|(?P<ACTION>双买|双卖|有买有卖|有卖有买|买入|卖出|买|卖)'
+    r'|(?P<ADJUST>调正|调负)'
+    r'|(?P<CLOSE>平|清)'
+    r'|(?P<EACH>各)'
+    r'|(?P<OPTION>(?<![A-Za-z])[cpdv](?![A-Za-z]))'
+)
+LEAD_CHARS = frozenset('0123456789千万')
+TAIL_CHARS = frozenset('0123456789当下隔双有买卖调平清各cpdv')
+AMOUNT_RE = re.compile(NUM)
+SPACE_RE = re.compile(r'\s+')
+
+symbols: SymbolTable = SymbolTable.load()
+
+
+class Token(NamedTuple):
+    type: str
+    value: str
+    start: int
+    end: int
+
+
+def tokenize(instruction: str, table: SymbolTable = None) -> List[Token]:
+    """
+    把指令切分为记号列表，未识别的字符（空格、"的"、"和"等）被跳过
+
+    一组敞口"万1 0.5"或"1 0.5份"拆成每个数值一个EXPOSURE记号，值带单位，
+    如"万1"、"万0.5"。table缺省为模块的符号表symbols。
+    """
+    table = table or symbols
+    tokens = []
+    pos, length = 0, len(instruction)
+    while pos < length:
+        char = instruction[pos]
+        match = LEAD_RE.match(instruction, pos) if char in LEAD_CHARS else None
+        if match and match.lastgroup == EXPOSURE:
+            text = match.group()
+            unit = '份' if text.endswith('份') else text[0]
+            for amount in AMOUNT_RE.finditer(text):
+                tokens.append(Token(EXPOSURE, unit + amount.group(), pos + amount.start(), pos + amount.end()))
+            pos = match.end()
+            continue
+        if match and match.lastgroup == PERCENT:
+            tokens.append(Token(PERCENT, SPACE_RE.sub('', match.group()), pos, match.end()))
+            pos = match.end()
+            continue
+
+        if match is None and char in table.trie:
+            alias = table.match(instruction, pos)
+            if alias is not None:
+                tokens.append(Token(TARGET, alias, pos, pos + len(alias)))
+                pos += len(alias)
+                continue
+
+        if match is None and char in TAIL_CHARS:
+            match = TAIL_RE.match(instruction, pos)
+
+        if match is None:
+            pos += 1
+            continue
+        tokens.append(Token(match.lastgroup, match.group(), pos, match.end()))
+        pos = match.end()
+    return tokens
@@ -0,0 +1,152 @@
+"""
+敞口换算手数
+
+把解析出的腿（engine.Leg）换算为下单手数：
+- 万x/千x: 金额敞口x万元/x千元。delta类指令除以每手现金delta（|delta| × 标的价格 × 合约乘数），
+  vega指令除以每手vega（|vega| × 合约乘数，vega按波动率变动1个百分点计）
+- 份x: 直接为x手
+- 平x%: 持仓手数的x%
+
+一批腿先编码为换算方式和数量两个数组（encode_legs），再与按腿对齐的greeks、价格、乘数、
+持仓数组做一次NumPy运算得到全部手数，取整和单合约手数上限同样向量化处理。
+双买/双卖vega的一手指call和put各一手，vega应传入两者之和。
+greeks为0或缺失（nan）的腿无法换算，手数为0。
+
+用法:
+    legs, rows = flatten(parse_many(lines, records=True))
+    lots = size_legs(legs, delta, vega, price, multiplier, position, max_lots=200)
+"""
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from engine import CLEAR, VEGA, Leg, ParseResult, parse_legs, parse_many
+
+UNIT_SCALES = {'万': 10_000, '千': 1_000}
+SHARE_UNIT = '份'
+
+# 换算方式
+NOTIONAL_DELTA = 0  # 金额敞口按现金delta换算
+NOTIONAL_VEGA = 1  # 金额敞口按vega换算
+SHARES = 2  # 直接给出手数
+CLOSE_RATIO = 3  # 按持仓比例平仓
+
+ROUNDING = {
+    'round': lambda lots: np.floor(lots + 0.5),  # 四舍五入，np.rint会把0.5舍到偶数
+    'floor': np.floor,
+    'ceil': np.ceil,
+}
+PRECISION = 9  # 取整前先保留的小数位，避免0.3 * 10000 / 1000之类的浮点误差被floor/ceil放大
+
+
+def flatten(results: Iterable[ParseResult]) -> Tuple[List[Leg], np.ndarray]:
+    """
+    展开parse_many(records=True)的结果，返回全部腿及每条腿所属结果的序号，解析失败的结果被跳过
+    """
+    legs, rows = [], []
+    for row, result in enumerate(results):
+        if result.error is None:
+            legs.extend(result.results)
+            rows.extend([row] * len(result.results))
+    return legs, np.array(rows, dtype=np.int64)
+
+
+def encode_legs(legs: Sequence[Leg]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    腿编码为 (换算方式, 数量)：金额敞口数量为元，份为手数，平仓为持仓比例
+    """
+    modes = np.empty(len(legs), dtype=np.int8)
+    amounts = np.empty(len(legs), dtype=np.float64)
+    for i, leg in enumerate(legs):
+        if leg.kind == CLEAR:
+            modes[i], amounts[i] = CLOSE_RATIO, float(leg.close_pct) / 100
+        elif leg.unit == SHARE_UNIT:
+            modes[i], amounts[i] = SHARES, float(leg.value)
+        else:
+            modes[i] = NOTIONAL_VEGA if leg.kind == VEGA else NOTIONAL_DELTA
+            amounts[i] = float(leg.value) * UNIT_SCALES[leg.unit]
+    return modes, amounts
+
+
+def size_lots(
+        modes: np.ndarray,
+        amounts: np.ndarray,
+        delta,
+        vega,
+        price,
+        multiplier,
+        position=0,
+        max_lots=None,
+        rounding: str = 'round'
+) -> np.ndarray:
+    """
+    按编码后的腿计算手数，返回非负整数数组
+
+    delta、vega、price、multiplier、position、max_lots为与腿对齐的数组或标量，
+    只用到各腿换算方式所需的那些。平仓手数不超过持仓，max_lots为空时不限制。
+    """
+    delta, vega, price, multiplier, position = (
+        np.asarray(values, dtype=np.float64) for values in (delta, vega, price, multiplier, position)
+    )
+    held = np.abs(position)
+    per_lot = np.where(modes == NOTIONAL_VEGA, np.abs(vega) * multiplier, np.abs(delta) * price * multiplier)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lots = np.select([modes == SHARES, modes == CLOSE_RATIO], [amounts, held * amounts], amounts / per_lot)
+    lots = np.where(np.isfinite(lots), lots, 0.0)
+
+    lots = ROUNDING[rounding](np.round(lots, PRECISION)).clip(0, None)
+    lots = np.where(modes == CLOSE_RATIO, np.minimum(lots, held), lots)
+    if max_lots is not None:
+        lots = np.minimum(lots, max_lots)
+    return lots.astype(np.int64)
+
+
+def size_legs(legs: Sequence[Leg], delta, vega, price, multiplier, position=0, max_lots=None, rounding='round') -> np.ndarray:
+    """
+    一批腿的手数，参数同size_lots
+    """
+    return size_lots(*encode_legs(legs), delta, vega, price, multiplier, position, max_lots, rounding)
+
+
+# (指令, delta, vega, 标的价格, 合约乘数, 持仓): 各腿手数
+test_cases = {
+    # 万1 / (0.5 × 5.5 × 10000) = 0.36
+    ("500 买 万1 的c", 0.5, 0.0, 5.5, 10_000, 0): [0],
+    # 万10 / (0.5 × 5.5 × 10000) = 3.64
+    ("500 买 万10 的c", 0.5, 0.0, 5.5, 10_000, 0): [4],
+    # 千3 / (0.3 × 1 × 10000) = 1，浮点误差不应使其变为0
+    ("500 卖出 当月 千3 的p", -0.3, 0.0, 1.0, 10_000, 0): [1],
+    # vega: 万1 / (0.005 × 10000) = 200，受max_lots限制
+    ("双买 500 下月 万1 的v", 0.0, 0.005, 5.5, 10_000, 0): [150],
+    # 千1 / (20 × 100) = 0.5，四舍五入为1
+    ("IM 双卖 当月 千1 的v", 0.0, 20.0, 6000.0, 100, 0): [1],
+    # 份直接为手数，0.5手四舍五入为1
+    ("科创50 80 有买有卖 调正 1 0.5份", 0.5, 0.0, 1.0, 10_000, 0): [1, 1],
+    # 平20%: 持仓-12手的20%为2.4手
+    ("500 5.5c 平20%", 0.6, 0.0, 5.5, 10_000, -12): [2],
+    ("500 5.5c 平100%", 0.6, 0.0, 5.5, 10_000, 7): [7],
+    # greeks为0无法换算
+    ("500 买 万1 的c", 0.0, 0.0, 5.5, 10_000, 0): [0],
+}
+
+
+def test_size_legs():
+    for (instruction, delta, vega, price, multiplier, position), expected in test_cases.items():
+        legs = parse_legs(instruction)
+        result = size_legs(legs, delta, vega, price, multiplier, position, max_lots=150).tolist()
+        assert result == expected, f"Failed on {instruction}: {result} != {expected}"
+        print(f"Passed on {instruction}: {result} == {expected}")
+
+    # 整批一次计算与逐条计算一致，解析失败的指令被跳过
+    results = list(parse_many([key[0] for key in test_cases] + ["500 万1"], records=True))
+    legs, rows = flatten(results)
+    columns = np.array([key[1:] for key in test_cases], dtype=np.float64)[rows].T
+    batch = size_legs(legs, *columns, max_lots=150).tolist()
+    expected = [lots for lots_list in test_cases.values() for lots in lots_list]
+    assert batch == expected, f"Failed on batch: {batch} != {expected}"
+
+    print("All test cases passed!")
+
+
+if __name__ == "__main__":
+    test_size_legs()
@@ -0,0 +1,154 @@
+"""
+行权价索引
+
+把解析结果中的行权价（如"put-0.85"、"call-5.5"、"put-2450"）解析为挂牌的期权合约。
+挂牌合约按 (标的, 到期日, 期权类型) 分组，每组的行权价保存为排好序的NumPy数组，
+用二分查找（np.searchsorted）做精确匹配或最近行权价匹配，整批行权价可一次向量化解析。
+
+用法:
+    index = StrikeIndex(listed_contracts)
+    index.resolve('沪500', expiry, 'put', 5.5)  # 合约代码，没有则为None
+    index.resolve_batch(underlyings, expiries, option_types, strikes, nearest=True)
+"""
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+STRIKE_TOLERANCE = 1e-6  # 精确匹配允许的行权价误差
+
+
+class ListedContract(NamedTuple):
+    symbol: str  # 合约代码
+    underlying: str  # 标的，如"沪500"
+    expiry: date  # 到期日
+    option_type: str  # call/put
+    strike: float
+
+
+class StrikeChain(NamedTuple):
+    strikes: np.ndarray  # 升序行权价，float64
+    symbols: np.ndarray  # 与strikes对齐的合约代码
+
+
+def nearest_positions(strikes: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    values中每个行权价在strikes中最接近的位置，距离相等时取较低的行权价
+    """
+    right = np.searchsorted(strikes, values).clip(0, len(strikes) - 1)
+    left = (right - 1).clip(0, None)
+    use_left = np.abs(values - strikes[left]) <= np.abs(strikes[right] - values)
+    return np.where(use_left, left, right)
+
+
+class StrikeIndex:
+    def __init__(self, contracts: Iterable[ListedContract]):
+        groups: Dict[Tuple[str, date, str], List[ListedContract]] = {}
+        for contract in contracts:
+            groups.setdefault((contract.underlying, contract.expiry, contract.option_type), []).append(contract)
+
+        self.chains: Dict[Tuple[str, date, str], StrikeChain] = {}
+        for key, listed in groups.items():
+            listed.sort(key=lambda contract: contract.strike)
+            self.chains[key] = StrikeChain(
+                np.array([contract.strike for contract in listed], dtype=np.float64),
+                np.array([contract.symbol for contract in listed], dtype=object),
+            )
+
+    def chain(self, underlying: str, expiry: date, option_type: str) -> Optional[StrikeChain]:
+        return self.chains.get((underlying, expiry, option_type))
+
+    def resolve(self, underlying: str, expiry: date, option_type: str, strike: float, nearest: bool = False) -> Optional[str]:
+        """
+        解析一个行权价，nearest为False时只接受精确匹配，找不到返回None
+        """
+        return self.resolve_batch([underlying], [expiry], [option_type], [strike], nearest)[0]
+
+    def resolve_batch(
+            self,
+            underlyings: Sequence[str],
+            expiries: Sequence[date],
+            option_types: Sequence[str],
+            strikes: Sequence[float],
+            nearest: bool = False
+    ) -> np.ndarray:
+        """
+        批量解析行权价，返回与输入对齐的合约代码数组，找不到的位置为None
+
+        同一 (标的, 到期日, 期权类型) 的行权价在一次searchsorted中解析。
+        """
+        strikes = np.asarray(strikes, dtype=np.float64)
+        result = np.full(len(strikes), None, dtype=object)
+
+        positions: Dict[Tuple[str, date, str], List[int]] = {}
+        for i, key in enumerate(zip(underlyings, expiries, option_types)):
+            positions.setdefault(key, []).append(i)
+
+        for key, rows in positions.items():
+            chain = self.chains.get(key)
+            if chain is None or not len(chain.strikes):
+                continue
+            rows = np.array(rows)
+            values = strikes[rows]
+            found = nearest_positions(chain.strikes, values)
+            if not nearest:
+                exact = np.abs(chain.strikes[found] - values) <= STRIKE_TOLERANCE
+                rows, found = rows[exact], found[exact]
+            result[rows] = chain.symbols[found]
+        return result
+
+    def resolve_legs(self, legs: Sequence, contract_months: Sequence, nearest: bool = False) -> np.ndarray:
+        """
+        为带行权价的engine.Leg解析合约，contract_months为对应的contracts.ContractMonth
+
+        没有行权价的腿结果为None。
+        """
+        rows = [i for i, leg in enumerate(legs) if leg.strike is not None]
+        result = np.full(len(legs), None, dtype=object)
+        if rows:
+            result[rows] = self.resolve_batch(
+                [legs[i].underlying for i in rows],
+                [contract_months[i].expiry for i in rows],
+                [legs[i].option_type for i in rows],
+                [float(legs[i].strike) for i in rows],
+                nearest,
+            )
+        return result
+
+
+test_expiry = date(2024, 6, 26)
+test_contracts = [
+    ListedContract(f"510500{option_type[0].upper()}2406M0{int(strike * 1000):04d}", '沪500', test_expiry, option_type, strike)
+    for option_type in ('call', 'put') for strike in (5.25, 5.5, 5.75, 6.0)
+]
+test_cases = {
+    ('沪500', 'put', 5.5, False): '510500P2406M05500',
+    ('沪500', 'call', 5.75, False): '510500C2406M05750',
+    ('沪500', 'call', 5.6, False): None,
+    ('沪500', 'call', 5.6, True): '510500C2406M05500',
+    ('沪500', 'put', 5.625, True): '510500P2406M05500',
+    ('沪500', 'put', 9.0, True): '510500P2406M06000',
+    ('沪500', 'put', 1.0, True): '510500P2406M05250',
+    ('深500', 'put', 5.5, True): None,
+}
+
+
+def test_resolve_strikes():
+    index = StrikeIndex(test_contracts)
+    for (underlying, option_type, strike, nearest), expected in test_cases.items():
+        result = index.resolve(underlying, test_expiry, option_type, strike, nearest)
+        assert result == expected, f"Failed on {underlying} {option_type} {strike}: {result} != {expected}"
+        print(f"Passed on {underlying} {option_type} {strike}: {result} == {expected}")
+
+    keys = list(test_cases)
+    batch = index.resolve_batch(
+        [key[0] for key in keys], [test_expiry] * len(keys), [key[1] for key in keys], [key[2] for key in keys], nearest=True
+    )
+    expected = [index.resolve(key[0], test_expiry, key[1], key[2], True) for key in keys]
+    assert list(batch) == expected, f"Failed on batch: {list(batch)} != {expected}"
+
+    print("All test cases passed!")
+
+
+if __name__ == "__main__":
+    test_resolve_strikes()
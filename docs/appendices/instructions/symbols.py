@@ -0,0 +1,97 @@
+"""
+标的符号表
+
+symbols.json按"标准标的 -> 别名、拆分"配置，例如：
+    "深100": {"aliases": ["100", "深圳100"]}
+    "500": {"expand": ["沪500", "深500"]}
+标准标的本身也是别名；expand给出多个敞口时依次拆分到的交易所标的，缺省为标的本身。
+有期权的标的另配product（期权品种代码）和calendar（到期规则，etf或index），
+供contracts.py解析合约月份。
+新增ETF或指数别名只需修改配置文件，或用load_symbols加载另一份配置。
+
+全部别名编译为一棵前缀树，按最长匹配查找，每个位置的查找步数只取决于最长别名的长度，
+与别名数量无关。纯数字别名（如"50"）前后不能紧挨数字或小数点，"1500"不会匹配出"500"。
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SYMBOLS_PATH = Path(__file__).with_name('symbols.json')
+
+END = None  # 前缀树中标记别名结束的键，值为完整别名
+NUMBER_CHARS = frozenset('0123456789.')
+
+
+class SymbolTable:
+    def __init__(self, underlyings: Dict[str, dict]):
+        self.aliases: Dict[str, str] = {}  # 别名 -> 标准标的
+        self.expansions: Dict[str, List[str]] = {}  # 标准标的 -> 拆分后的交易所标的
+        self.specs: Dict[str, dict] = {}  # 标准标的 -> 配置
+        self.trie: dict = {}
+
+        for name, spec in underlyings.items():
+            self.specs[name] = spec
+            self.expansions[name] = list(spec.get('expand', [name]))
+            for alias in [name] + list(spec.get('aliases', [])):
+                self.add_alias(alias, name)
+
+    @classmethod
+    def load(cls, path: str | Path = SYMBOLS_PATH) -> "SymbolTable":
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def add_alias(self, alias: str, name: str) -> None:
+        if self.aliases.get(alias, name) != name:
+            raise ValueError(f"Alias {alias!r} is already mapped to {self.aliases[alias]!r}")
+        self.aliases[alias] = name
+
+        node = self.trie
+        for char in alias:
+            node = node.setdefault(char, {})
+        node[END] = alias
+
+    def match(self, text: str, pos: int) -> Optional[str]:
+        """
+        返回从pos开始的最长别名，没有则返回None
+        """
+        node, candidates = self.trie, []
+        for i in range(pos, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if END in node:
+                candidates.append(node[END])
+
+        for alias in reversed(candidates):
+            if not alias.isdigit():
+                return alias
+            end = pos + len(alias)
+            if (pos == 0 or text[pos - 1] not in NUMBER_CHARS) and (end == len(text) or text[end] not in NUMBER_CHARS):
+                return alias
+        return None
+
+    def find_all(self, text: str) -> List[Tuple[str, int, int]]:
+        """
+        从左到右找出全部不重叠的别名，返回 (别名, 起始位置, 结束位置)
+        """
+        found, pos = [], 0
+        while pos < len(text):
+            alias = self.match(text, pos) if text[pos] in self.trie else None
+            if alias is None:
+                pos += 1
+                continue
+            found.append((alias, pos, pos + len(alias)))
+            pos += len(alias)
+        return found
+
+    def resolve(self, alias: str) -> str:
+        """
+        别名转为标准标的
+        """
+        return self.aliases.get(alias, alias)
+
+    def expand(self, name: str, return_num: int = 1) -> List[str]:
+        """
+        标准标的拆分为前return_num个交易所标的
+        """
+        return self.expansions.get(name, [name])[:return_num]
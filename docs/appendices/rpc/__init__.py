@@ -1,11 +1,15 @@
+import itertools
 import os
+import pickle
 import signal
 import threading
 import traceback
 import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timedelta
 from functools import lru_cache
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Deque, Dict
 from pathlib import Path
 
 import zmq
@@ -22,6 +26,8 @@ NOT_ALIVE_TOPIC: str = "_not_alive"
 KEEP_ALIVE_INTERVAL: timedelta = timedelta(seconds=1)
 KEEP_ALIVE_TOLERANCE: timedelta = timedelta(seconds=3)
 
+WORKER_READY: bytes = b"\x01"  # Sent by pool workers when they start
+
 
 class RemoteException(Exception):
     """
@@ -63,9 +69,21 @@ def kill_port_process(port: int, kill_parent_cmd: bool):
 class RpcServer:
     """"""
 
-    def __init__(self):
+    def __init__(self, pipelined: bool = False, executor: str = "", max_workers: int = 4):
         """
         Constructor
+
+        pipelined: serve requests from a ROUTER socket, replying with the
+        envelope each request arrived with. This accepts both REQ clients and
+        pipelined RpcClients that keep many calls outstanding.
+
+        executor: "" runs requests one at a time in the server thread;
+        "thread" or "process" fans them out from a ROUTER frontend over an
+        inproc ROUTER to max_workers REQ worker threads, each request going to
+        a worker that is idle, so one slow function only occupies its own
+        worker. With "process" each worker thread runs
+        its call on a process pool, which needs module-level, picklable
+        functions and arguments.
         """
         # Save functions dict: key is fuction name, value is fuction object
         self.__functions: Dict[str, Any] = {}
@@ -73,8 +91,12 @@ class RpcServer:
         # Zmq port related
         self.__context: zmq.Context = zmq.Context()
 
-        # Reply socket (Request–reply pattern)
-        self.__socket_rep: zmq.Socket = self.__context.socket(zmq.REP)
+        # Reply socket (Request–reply pattern), ROUTER when pipelined or pooled
+        assert executor in ("", "thread", "process"), f"unknown executor: {executor}"
+        self.__pipelined: bool = pipelined or bool(executor)
+        self.__executor: str = executor
+        self.__max_workers: int = max_workers
+        self.__socket_rep: zmq.Socket = self.__context.socket(zmq.ROUTER if self.__pipelined else zmq.REP)
 
         # Publish socket (Publish–subscribe pattern)
         self.__socket_pub: zmq.Socket = self.__context.socket(zmq.PUB)
@@ -82,6 +104,7 @@ class RpcServer:
         # Worker thread related
         self.__active: bool = False  # RpcServer status
         self.__thread: threading.Thread = None  # RpcServer thread
+        self.__keep_alive_thread: threading.Thread = None  # Publishes KEEP_ALIVE_TOPIC
         self.__lock: threading.Lock = threading.Lock()
 
         # Authenticator used to ensure data security
@@ -147,6 +170,10 @@ class RpcServer:
         self.__thread = threading.Thread(target=self.run)
         self.__thread.start()
 
+        # Keep-alive runs on its own timer, independent of request handling
+        self.__keep_alive_thread = threading.Thread(target=self.run_keep_alive)
+        self.__keep_alive_thread.start()
+
     def stop(self) -> None:
         """
         Stop RpcServer
@@ -163,44 +190,142 @@ class RpcServer:
             self.__thread.join()
         self.__thread = None
 
+        if self.__keep_alive_thread and self.__keep_alive_thread.is_alive():
+            self.__keep_alive_thread.join()
+        self.__keep_alive_thread = None
+
+    def run_keep_alive(self) -> None:
+        """
+        Publish keep-alive every KEEP_ALIVE_INTERVAL while active
+        """
+        interval = KEEP_ALIVE_INTERVAL.total_seconds()
+        while self.__active:
+            self.publish(KEEP_ALIVE_TOPIC, datetime.utcnow())
+            time.sleep(interval)
+
     def run(self) -> None:
         """
         Run RpcServer functions
         """
-        start = datetime.utcnow()
+        if self.__executor:
+            self.run_pool()
+        else:
+            self.run_inline()
 
+        # Unbind socket address
+        with self.__lock:
+            self.__socket_pub.unbind(self.__socket_pub.LAST_ENDPOINT)
+        self.__socket_rep.unbind(self.__socket_rep.LAST_ENDPOINT)
+
+    def run_inline(self) -> None:
+        """
+        Receive, execute and reply to requests one at a time
+        """
         while self.__active:
             # Use poll to wait event arrival, waiting time is 1 second (1000 milliseconds)
-            cur = datetime.utcnow()
-            delta = cur - start
-
-            if delta >= KEEP_ALIVE_INTERVAL:
-                start = cur
-                self.publish(KEEP_ALIVE_TOPIC, cur)
-
             if not self.__socket_rep.poll(1000):
                 continue
 
+            if self.__pipelined:
+                # Envelope is the client identity plus whatever the client
+                # put before the payload (request id and delimiter)
+                *envelope, data = self.__socket_rep.recv_multipart()
+                rep = self.handle_request(pickle.loads(data))
+                self.__socket_rep.send_multipart(envelope + [pickle.dumps(rep)])
+                continue
+
             # Receive request data from Reply socket
             req = self.__socket_rep.recv_pyobj()
 
-            # Get function name and parameters
-            name, args, kwargs = req
-
-            # Try to get and execute callable function object; capture exception information if it fails
-            try:
-                func = self.__functions[name]
-                r = func(*args, **kwargs)
-                rep = [True, r]
-            except Exception as e:  # noqa
-                rep = [False, traceback.format_exc()]
+            rep = self.handle_request(req)
 
             # send callable response by Reply socket
             self.__socket_rep.send_pyobj(rep)
 
-        # Unbind socket address
-        self.__socket_pub.unbind(self.__socket_pub.LAST_ENDPOINT)
-        self.__socket_rep.unbind(self.__socket_rep.LAST_ENDPOINT)
+    def run_pool(self) -> None:
+        """
+        Fan requests out from the ROUTER frontend to REQ worker threads
+
+        Workers announce themselves with WORKER_READY and every reply marks
+        the worker idle again. Requests go to the least recently used idle
+        worker, and the frontend is only read while some worker is idle, so a
+        request never queues behind a slow call. Each worker replies with the
+        envelope it received, so the frontend routes the result back to its
+        client by identity.
+        """
+        backend: zmq.Socket = self.__context.socket(zmq.ROUTER)
+        backend_address = f"inproc://rpc-server-{id(self):x}"
+        backend.bind(backend_address)
+
+        pool = ProcessPoolExecutor(max_workers=self.__max_workers) if self.__executor == "process" else None
+        workers = [
+            threading.Thread(target=self.run_worker, args=(backend_address, pool))
+            for _ in range(self.__max_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        idle: Deque[bytes] = deque()
+        backend_poller = zmq.Poller()
+        backend_poller.register(backend, zmq.POLLIN)
+        poller = zmq.Poller()
+        poller.register(backend, zmq.POLLIN)
+        poller.register(self.__socket_rep, zmq.POLLIN)
+
+        while self.__active:
+            # Only accept new requests while a worker is free to take them
+            items = dict((poller if idle else backend_poller).poll(1000))
+
+            if backend in items:
+                worker_id, empty, *reply = backend.recv_multipart()
+                idle.append(worker_id)
+                if reply != [WORKER_READY]:
+                    self.__socket_rep.send_multipart(reply)
+            if self.__socket_rep in items and idle:
+                backend.send_multipart([idle.popleft(), b""] + self.__socket_rep.recv_multipart())
+
+        for worker in workers:
+            worker.join()
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        backend.close()
+
+    def run_worker(self, backend_address: str, pool: ProcessPoolExecutor = None) -> None:
+        """
+        Serve requests handed out by the pool backend, one at a time
+        """
+        socket: zmq.Socket = self.__context.socket(zmq.REQ)
+        socket.connect(backend_address)
+        socket.send(WORKER_READY)
+
+        while self.__active:
+            if not socket.poll(1000):
+                continue
+
+            *envelope, data = socket.recv_multipart()
+            rep = self.handle_request(pickle.loads(data), pool)
+            socket.send_multipart(envelope + [pickle.dumps(rep)])
+
+        socket.close()
+
+    def handle_request(self, req: list, pool: ProcessPoolExecutor = None) -> list:
+        """
+        Execute a [name, args, kwargs] request and return [ok, result]
+        """
+        # Get function name and parameters
+        name, args, kwargs = req
+
+        # Try to get and execute callable function object; capture exception information if it fails
+        try:
+            func = self.__functions[name]
+            if pool:
+                r = pool.submit(func, *args, **kwargs).result()
+            else:
+                r = func(*args, **kwargs)
+            rep = [True, r]
+        except Exception as e:  # noqa
+            rep = [False, traceback.format_exc()]
+        return rep
 
     def publish(self, topic: str, data: Any) -> None:
         """
@@ -225,13 +350,30 @@ class RpcServer:
 class RpcClient:
     """"""
 
-    def __init__(self):
-        """Constructor"""
+    def __init__(self, pipelined: bool = False):
+        """
+        Constructor
+
+        pipelined: send calls over a DEALER socket tagged with a request id,
+        so calls from many threads are in flight together instead of queueing
+        behind one REQ round trip. Caller threads hand requests to a
+        dedicated I/O thread through one inproc PUSH socket guarded by a lock.
+        """
         # zmq port related
         self.__context: zmq.Context = zmq.Context()
 
-        # Request socket (Request–reply pattern)
-        self.__socket_req: zmq.Socket = self.__context.socket(zmq.REQ)
+        # Request socket (Request–reply pattern), DEALER when pipelined
+        self.__pipelined: bool = pipelined
+        self.__socket_req: zmq.Socket = self.__context.socket(zmq.DEALER if pipelined else zmq.REQ)
+
+        # Pipelined mode related
+        self.__socket_pipe: zmq.Socket = None  # PULL end read by the I/O thread
+        self.__pipe_address: str = f"inproc://rpc-client-{id(self):x}"
+        self.__socket_push: zmq.Socket = None  # PUSH end shared by caller threads
+        self.__push_lock: threading.Lock = threading.Lock()  # Guards __socket_push
+        self.__pending: Dict[bytes, Future] = {}  # request id -> Future of [ok, result]
+        self.__req_ids = itertools.count()
+        self.__io_thread: threading.Thread = None
 
         # Subscribe socket (Publish–subscribe pattern)
         self.__socket_sub: zmq.Socket = self.__context.socket(zmq.SUB)
@@ -258,9 +400,12 @@ class RpcClient:
             req = [name, args, kwargs]
 
             # Send request and wait for response
-            with self.__lock:
-                self.__socket_req.send_pyobj(req)
-                rep = self.__socket_req.recv_pyobj()
+            if self.__pipelined:
+                rep = self.__call_pipelined(req)
+            else:
+                with self.__lock:
+                    self.__socket_req.send_pyobj(req)
+                    rep = self.__socket_req.recv_pyobj()
 
             # Return response if successed; Trigger exception if failed
             if rep[0]:
@@ -307,6 +452,12 @@ class RpcClient:
         self.__socket_req.connect(req_address)
         self.__socket_sub.connect(sub_address)
 
+        if self.__pipelined:
+            self.__socket_pipe = self.__context.socket(zmq.PULL)
+            self.__socket_pipe.bind(self.__pipe_address)
+            self.__socket_push = self.__context.socket(zmq.PUSH)
+            self.__socket_push.connect(self.__pipe_address)
+
         # Start RpcClient status
         self.__active = True
 
@@ -314,6 +465,10 @@ class RpcClient:
         self.__thread = threading.Thread(target=self.run)
         self.__thread.start()
 
+        if self.__pipelined:
+            self.__io_thread = threading.Thread(target=self.run_pipeline)
+            self.__io_thread.start()
+
         self._last_received_ping = datetime.utcnow()
 
     def stop(self) -> None:
@@ -332,6 +487,71 @@ class RpcClient:
             self.__thread.join()
         self.__thread = None
 
+        if self.__io_thread and self.__io_thread.is_alive():
+            self.__io_thread.join()
+        self.__io_thread = None
+
+    def __call_pipelined(self, req: list) -> list:
+        """
+        Queue a request for the I/O thread and wait for its reply
+        """
+        req_id = str(next(self.__req_ids)).encode()
+        future = Future()
+        with self.__lock:
+            if not self.__active:
+                return [False, "RpcClient is not active"]
+            self.__pending[req_id] = future
+
+        data = pickle.dumps(req)
+        with self.__push_lock:
+            # Closed by the I/O thread on shutdown, which also fails the future
+            if not self.__socket_push.closed:
+                self.__socket_push.send_multipart([req_id, data])
+        return future.result()
+
+    def run_pipeline(self) -> None:
+        """
+        Forward queued requests to the server and resolve replies by request id
+        """
+        poller = zmq.Poller()
+        poller.register(self.__socket_pipe, zmq.POLLIN)
+        poller.register(self.__socket_req, zmq.POLLIN)
+
+        while self.__active:
+            items = dict(poller.poll(1000))
+
+            if self.__socket_pipe in items:
+                while True:
+                    try:
+                        req_id, data = self.__socket_pipe.recv_multipart(NOBLOCK)
+                    except zmq.Again:
+                        break
+                    self.__socket_req.send_multipart([req_id, b"", data])
+
+            if self.__socket_req in items:
+                while True:
+                    try:
+                        req_id, _, data = self.__socket_req.recv_multipart(NOBLOCK)
+                    except zmq.Again:
+                        break
+                    with self.__lock:
+                        future = self.__pending.pop(req_id, None)
+                    if future:
+                        future.set_result(pickle.loads(data))
+
+        # New calls are rejected once inactive; close the PUSH socket under its
+        # lock so no caller is inside send, then fail calls still waiting
+        with self.__push_lock:
+            self.__socket_push.close()
+        with self.__lock:
+            pending, self.__pending = self.__pending, {}
+        for future in pending.values():
+            future.set_result([False, "RpcClient stopped"])
+
+        # Close socket
+        self.__socket_pipe.close()
+        self.__socket_req.close()
+
     def run(self) -> None:
         """
         Run RpcClient function
@@ -357,8 +577,9 @@ class RpcClient:
                 # Process data by callable function
                 self.callback(topic, data)
 
-        # Close socket
-        self.__socket_req.close()
+        # Close socket, the I/O thread owns the request socket when pipelined
+        if not self.__pipelined:
+            self.__socket_req.close()
         self.__socket_sub.close()
 
     @staticmethod
@@ -388,4 +609,4 @@ def generate_certificates(name: str) -> None:
     if not keys_path.exists():
         os.mkdir(keys_path)
 
-    zmq.auth.create_certificates(keys_path, name)
\ No newline at end of file
+    zmq.auth.create_certificates(keys_path, name)
\ No newline at end of file
@@ -1,10 +1,15 @@
 from .mdcliapi2 import MajorDomoClient
 from .mdbroker import MajorDomoBroker
+from .mdshard import ShardedMajorDomoBroker
 from .mdwrkapi import MajorDomoWorker
-from .zhelpers import port_available_check
+from .zhelpers import port_available_check, zpipe
+from .codec import PickleCodec, encode_reply, get_codec
+from .aiorpc import AsyncRpcClient, AsyncRpcWorker
 
 import pickle
-from functools import lru_cache
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
 import zmq
 import threading
 import datetime
@@ -14,15 +19,125 @@ import queue
 
 KEEP_ALIVE_TOLERANCE = datetime.timedelta(seconds=5)
 
+# 批量请求的函数名，请求体为[BATCH_REQUEST, [[name, args, kwargs], ...], {"parallel": bool}]
+BATCH_REQUEST = "_rpc_batch"
+BATCH_MAX_THREADS = 32  # 并行批量请求最多使用的线程数
+
+
+def call_function(func: Callable, args: Any, kwargs: Dict[str, Any]) -> list:
+    """
+    Run a registered function and wrap the outcome as [ok, result]
+
+    Module level so that process pools can pickle it.
+    """
+    try:
+        return [True, func(*args, **kwargs)]
+    except Exception as e:  # noqa
+        return [False, traceback.format_exc()]
+
+
+def unknown_function(name: str, *args, **kwargs) -> None:
+    """
+    Stand-in for a batch entry naming an unregistered function
+    """
+    raise KeyError(name)
+
+
+def call_batch(calls: list, parallel: bool = False) -> list:
+    """
+    Run (func, args, kwargs) calls and return their [ok, result] entries in order
+
+    Calls run one after another, or on their own short-lived thread pool when
+    parallel, so a batch never waits on the pool that is running it.
+    """
+    if not parallel or len(calls) < 2:
+        return [call_function(*call) for call in calls]
+
+    with ThreadPoolExecutor(max_workers=min(len(calls), BATCH_MAX_THREADS)) as pool:
+        return list(pool.map(lambda call: call_function(*call), calls))
+
+
+class ConflatingQueue:
+    """
+    Queue that keeps only the newest pending item per key
+
+    A put() for a key that is still pending replaces that item in place, so
+    the key keeps its place in line. get() mirrors queue.Queue.get.
+    """
+
+    def __init__(self):
+        self.items: OrderedDict = OrderedDict()
+        self.cond: threading.Condition = threading.Condition()
+
+    def put(self, item: Any, key: Any) -> bool:
+        """
+        Queue item under key, returning True if it replaced a pending item
+        """
+        with self.cond:
+            replaced = key in self.items
+            self.items[key] = item
+            self.cond.notify()
+        return replaced
+
+    def get(self, block: bool = True, timeout: float = None) -> Any:
+        with self.cond:
+            if block and not self.cond.wait_for(lambda: self.items, timeout):
+                raise queue.Empty
+            if not self.items:
+                raise queue.Empty
+            return self.items.popitem(last=False)[1]
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        with self.cond:
+            return len(self.items)
+
+    def empty(self) -> bool:
+        return not self.qsize()
+
 
 class RpcPublisher:
-    def __init__(self, addr: str = ""):
+    def __init__(
+            self,
+            addr: str = "",
+            conflate: bool = False,
+            conflate_key: Callable[[str, Any], Any] = None,
+            batch_size: int = 256,
+            packed: bool = False,
+            hwm: int = 0,
+            hwm_policy: str = "block"
+    ):
+        """
+        conflate: when the sender thread falls behind, keep only the newest
+        pending event per topic and drop the stale ones. conflate_key(topic,
+        event) narrows the key further, e.g. to the symbol of a tick.
+        Dropped events are counted in dropped and dropped_topics.
+
+        batch_size: the sender drains up to this many queued events per
+        wakeup. packed: send each drained topic as one [topic, data, data, ...]
+        message instead of one message per event; RpcSubscriber unpacks it.
+
+        hwm: bound on queued events, 0 for unbounded. When full, hwm_policy
+        "block" waits for the sender, "drop_oldest" discards the oldest queued
+        event (counted as dropped) and "raise" raises queue.Full. A conflating
+        queue is already bounded by its number of keys and ignores hwm.
+        """
+        assert hwm_policy in ("block", "drop_oldest", "raise"), f"unknown hwm_policy: {hwm_policy}"
         self.context: zmq.Context = zmq.Context()
         self.socket: zmq.Socket = self.context.socket(zmq.PUB)
         self.active: bool = False
         self.lock: threading.Lock = threading.Lock()
         self.addr: str = addr
-        self.queue: queue.Queue = queue.Queue()
+        self.conflate: bool = conflate or conflate_key is not None
+        self.conflate_key: Callable[[str, Any], Any] = conflate_key
+        self.queue: queue.Queue | ConflatingQueue = ConflatingQueue() if self.conflate else queue.Queue(hwm)
+        self.batch_size: int = max(1, batch_size)
+        self.packed: bool = packed
+        self.hwm_policy: str = hwm_policy
+        self.dropped: int = 0  # 合并或drop_oldest丢弃的消息数
+        self.dropped_topics: Dict[str, int] = defaultdict(int)
         self.publish_thread: threading.Thread = None
 
     def start(self) -> None:
@@ -39,16 +154,67 @@ class RpcPublisher:
                 return
         topic_bytes = topic.encode('utf-8')
         data_bytes = pickle.dumps(event)
-        self.queue.put((topic_bytes, data_bytes))  # 只有在活动状态时，才将消息放入队列
+        if not self.conflate:
+            self._put((topic_bytes, data_bytes))  # 只有在活动状态时，才将消息放入队列
+            return
+
+        key = topic if self.conflate_key is None else (topic, self.conflate_key(topic, event))
+        if self.queue.put((topic_bytes, data_bytes), key):
+            with self.lock:
+                self.dropped += 1
+                self.dropped_topics[topic] += 1
+
+    def _put(self, item: tuple) -> None:
+        """
+        Queue item, applying hwm_policy when the queue is full
+        """
+        if self.hwm_policy == "block":
+            self.queue.put(item)
+            return
+        if self.hwm_policy == "raise":
+            self.queue.put_nowait(item)
+            return
+
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            try:
+                topic_bytes, _ = self.queue.get_nowait()
+            except queue.Empty:
+                continue  # Sender drained it meanwhile
+            with self.lock:
+                self.dropped += 1
+                self.dropped_topics[topic_bytes.decode('utf-8')] += 1
 
     def _process_queue(self):
         while True:
             try:
-                topic_bytes, data_bytes = self.queue.get(block=True, timeout=1)
-                self.socket.send_multipart([topic_bytes, data_bytes])
+                events = [self.queue.get(block=True, timeout=1)]
             except queue.Empty:
                 continue
 
+            # 每次唤醒最多取出batch_size条，连续发送
+            while len(events) < self.batch_size:
+                try:
+                    events.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not self.packed:
+                for topic_bytes, data_bytes in events:
+                    self.socket.send_multipart([topic_bytes, data_bytes])
+                continue
+
+            # 同一主题的消息打包为一条[topic, data, data, ...]，保持主题内顺序
+            frames: Dict[bytes, list] = {}
+            for topic_bytes, data_bytes in events:
+                frames.setdefault(topic_bytes, [topic_bytes]).append(data_bytes)
+            for message in frames.values():
+                self.socket.send_multipart(message)
+
     def is_active(self) -> bool:
         with self.lock:
             return self.active
@@ -70,13 +236,50 @@ class RpcPublisher:
         self.socket.close()
 
 
+class LazyEvent:
+    """
+    Received event payload, unpickled on first access
+
+    get() returns the event; attribute access is forwarded to it. buffer is
+    the raw pickled payload, a memoryview on the zmq frame.
+    """
+    __slots__ = ("frame", "event")
+
+    NOT_LOADED = object()
+
+    def __init__(self, frame: zmq.Frame | bytes):
+        self.frame = frame
+        self.event = LazyEvent.NOT_LOADED
+
+    @property
+    def buffer(self) -> memoryview:
+        return self.frame.buffer if isinstance(self.frame, zmq.Frame) else memoryview(self.frame)
+
+    def get(self) -> Any:
+        if self.event is LazyEvent.NOT_LOADED:
+            self.event = pickle.loads(self.buffer)
+        return self.event
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+
 class RpcSubscriber:
-    def __init__(self):
+    def __init__(self, lazy: bool = False, topic_filter: Callable[[str], bool] = None):
+        """
+        lazy: receive without copying and pass callbacks a LazyEvent that is
+        only unpickled when used, instead of the unpickled event.
+
+        topic_filter: messages whose topic it rejects are dropped before
+        their payload is touched, to narrow wide SUB prefixes.
+        """
         self.context: zmq.Context = zmq.Context()
         self.socket: zmq.Socket = self.context.socket(zmq.SUB)
 
         self.active: bool = False
         self.thread: threading.Thread = None
+        self.lazy: bool = lazy
+        self.topic_filter: Callable[[str], bool] = topic_filter
 
     def start(self, addr: str) -> None:
         self.socket.connect(addr)
@@ -92,8 +295,8 @@ class RpcSubscriber:
                 continue
             recv = None
             try:
-                recv = self.socket.recv_multipart()
-                topic, data = recv
+                recv = self.socket.recv_multipart(copy=not self.lazy)
+                topic, data, *packed = recv  # 打包消息在主题后带多条数据
             except ValueError as e:
                 for i in recv:
                     try:
@@ -103,15 +306,23 @@ class RpcSubscriber:
 
                     print(f"recv_multipart error: {e}, recv: {r}")
                 continue
-            topic = topic.decode()
-            event = pickle.loads(data)
-            self.callback(topic, event)
+            # 先按主题过滤，未通过的消息不做反序列化
+            topic = topic.bytes.decode() if self.lazy else topic.decode()
+            if self.topic_filter and not self.topic_filter(topic):
+                continue
+
+            decode = LazyEvent if self.lazy else pickle.loads
+            self.callback(topic, decode(data))
+            for data in packed:
+                self.callback(topic, decode(data))
 
         self.socket.close()
 
     def callback(self, topic: str, event: Any) -> None:
         """
         Callable function
+
+        event is a LazyEvent when the subscriber is lazy.
         """
         raise NotImplementedError
 
@@ -129,10 +340,17 @@ class RpcSubscriber:
 
 
 class RpcClient(MajorDomoClient):
-    def __init__(self, broker: str, verbose: bool = False):
+    def __init__(self, broker: str, verbose: bool = False, codec: str = "pickle", decode_replies: bool = False):
+        """
+        decode_replies: also unpickle replies to pickle requests before
+        passing them to callback. Off by default, so existing callbacks keep
+        receiving the raw pickled bytes.
+        """
         super().__init__(broker, verbose)
         self.active = False
         self.thread = None  # RpcClient thread
+        self.codec = get_codec(codec)  # 默认编码，单次调用可用_rpc_codec覆盖
+        self.decode_replies = decode_replies
 
     def start(self) -> None:
         with self.lock:  # 使用锁保护active状态的修改
@@ -150,26 +368,56 @@ class RpcClient(MajorDomoClient):
 
             assert "_rpc_service" in kwargs, "miss _rpc_service"
             _rpc_service = kwargs.pop('_rpc_service')
+            _rpc_codec = kwargs.pop('_rpc_codec', None)
 
             # 生成请求
             req = [name, args, kwargs]
-            # 发送请求
-            request = pickle.dumps(req)
-            req_id = self.send(_rpc_service, request)
-            return req_id
+            return self.send_call(_rpc_service, req, _rpc_codec)
 
         return dorpc
 
+    def send_call(self, service: str, req: list, codec: Any = None) -> str:
+        """
+        Encode a [name, args, kwargs] request and send it, returning the request id
+        """
+        codec = self.codec if codec is None else get_codec(codec)
+        # 发送请求，非pickle编码在请求体前附加编码帧
+        request = codec.dumps(req)
+        if codec is not PickleCodec:
+            request = [codec.id, request]
+        return self.send(service, request)
+
+    def batch(self, _rpc_service: str, parallel: bool = False, _rpc_codec: str = None) -> "RpcBatch":
+        """
+        Gather calls to one service and send them as a single request
+
+            with client.batch(_rpc_service="greeks") as batch:
+                for symbol in symbols:
+                    batch.get_greeks(symbol)
+            req_id = batch.req_id
+
+        The reply is [True, [[ok, result], ...]] with one entry per call, in
+        call order; the worker runs the calls concurrently when parallel.
+        """
+        return RpcBatch(self, _rpc_service, parallel, _rpc_codec)
+
     def run(self):
         while self.active:
+            # recv() returns as soon as send() queues a request
             while not self.queue.empty():
                 request = self.queue.get()
                 self.client.send_multipart(request)
 
             reply = self.recv()
             if reply:
-                req_id, rep = reply
+                req_id, *frames = reply
                 req_id = req_id.decode()
+                if len(frames) == 2:
+                    codec_id, rep = frames
+                    rep = get_codec(codec_id).loads(rep)
+                else:
+                    # 未带编码帧的回复为pickle，默认原样交给callback
+                    rep = PickleCodec.loads(frames[0]) if self.decode_replies else frames[0]
                 self.callback(req_id, rep)
 
         self.close()
@@ -177,6 +425,10 @@ class RpcClient(MajorDomoClient):
     def callback(self, req_id: str, rep: Any) -> None:
         """
         Callable function
+
+        rep is the decoded [ok, result] list for requests sent with a non-pickle
+        codec. For pickle requests it is the raw pickled bytes, or the decoded
+        list when the client was created with decode_replies=True.
         """
         raise NotImplementedError
 
@@ -189,19 +441,75 @@ class RpcClient(MajorDomoClient):
                 return
 
         self.active = False
+        self.wake()
         if self.thread and self.thread.is_alive():
             self.thread.join()
         self.thread = None
         self.close()
 
 
+class RpcBatch:
+    """
+    Calls gathered by RpcClient.batch(), sent as one request when the block exits
+
+    Each call returns its index in the batch reply. Nothing is sent if the
+    block raises or no call was made.
+    """
+
+    def __init__(self, client: RpcClient, service: str, parallel: bool = False, codec: str = None):
+        self.client = client
+        self.service = service
+        self.parallel = parallel
+        self.codec = codec
+        self.calls: list = []
+        self.req_id: str = None
+
+    def __getattr__(self, name: str):
+        def add(*args, **kwargs) -> int:
+            self.calls.append([name, args, kwargs])
+            return len(self.calls) - 1
+
+        return add
+
+    def __enter__(self) -> "RpcBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb) -> None:
+        if exc_type is not None or not self.calls:
+            return
+
+        with self.client.lock:
+            if not self.client.active:
+                return
+        req = [BATCH_REQUEST, self.calls, {"parallel": self.parallel}]
+        self.req_id = self.client.send_call(self.service, req, self.codec)
+
+
 class RpcWorker(MajorDomoWorker):
-    def __init__(self, broker: str | int, service: str | bytes, verbose: bool = False):
+    def __init__(
+            self,
+            broker: str | int,
+            service: str | bytes,
+            verbose: bool = False,
+            executor: str = "",
+            max_workers: int = 4,
+            max_in_flight: int = 0
+    ):
+        """
+        executor: "" runs requests inline one at a time; "thread" or "process"
+        runs them on a pool of max_workers, with up to max_in_flight requests
+        (default max_workers) outstanding. Process pools need module-level,
+        picklable functions and picklable arguments.
+        """
         if isinstance(broker, int):
             broker = f"tcp://localhost:{broker}"
         if isinstance(service, str):
             service = service.encode()
-        super().__init__(broker, service, verbose)
+        assert executor in ("", "thread", "process"), f"unknown executor: {executor}"
+        self.executor = executor
+        self.max_workers = max_workers
+        capacity = (max_in_flight or max_workers) if executor else 1
+        super().__init__(broker, service, verbose, capacity)
         self.lock = threading.Lock()
         self.__functions: Dict[str, Any] = {}
         self.active = False
@@ -218,24 +526,133 @@ class RpcWorker(MajorDomoWorker):
             return self.active
 
     def run(self):
+        if self.executor:
+            self.run_concurrent()
+            return
+
         reply = None
         while self.active:
             request = self.recv(reply)
             if request is None:
                 break  # Worker was interrupted
-            req_id, req = request
-            name, args, kwargs = pickle.loads(req)
+            req_id, *frames = request
+            reply = [req_id] + self.handle_request(frames)
+
+        self.destroy()
+
+    def run_concurrent(self):
+        """
+        Serve requests on an executor pool
+
+        Completed replies are queued by the pool and the loop is woken through
+        an inproc pipe, so only this thread touches the broker socket.
+        Liveness is only counted down while we have spare capacity, since the
+        broker does not heartbeat fully busy workers.
+        """
+        if self.executor == "process":
+            pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        completed: queue.Queue = queue.Queue()
+        wake_recv, wake_send = zpipe(self.ctx)
+        wake_lock = threading.Lock()
+        self.poller.register(wake_recv, zmq.POLLIN)
+        in_flight = 0
+
+        def on_done(reply_to: bytes, req_id: bytes, codec: Any, framed: bool, future: Future) -> None:
             try:
-                with self.lock:
-                    func = self.__functions[name]
-                r = func(*args, **kwargs)
-                rep = [True, r]
-            except Exception as e:  # noqa
+                rep = future.result()
+            except Exception as e:  # noqa 如进程池崩溃或参数无法序列化
                 rep = [False, traceback.format_exc()]
-            reply = [req_id, pickle.dumps(rep)]
+            completed.put((reply_to, [req_id] + encode_reply(codec, framed, rep)))
+            with wake_lock:
+                if wake_send.closed:
+                    return  # Worker stopped while the call ran; its reply is dropped
+                try:
+                    wake_send.send(b"", zmq.NOBLOCK)
+                except zmq.Again:
+                    pass  # A wakeup is already pending
 
+        while self.active:
+            try:
+                items = dict(self.poller.poll(self.timeout))
+            except KeyboardInterrupt:
+                break  # Interrupted
+
+            if wake_recv in items:
+                while wake_recv.poll(0):
+                    wake_recv.recv()
+            while True:
+                try:
+                    reply_to, reply = completed.get_nowait()
+                except queue.Empty:
+                    break
+                self.send_reply(reply_to, reply)
+                in_flight -= 1
+
+            if self.worker in items:
+                request = self.process_message(self.worker.recv_multipart())
+                if request is not None:
+                    reply_to, (req_id, *frames) = request
+                    codec, framed, call, rep = self.decode_request(frames)
+                    if call is None:
+                        self.send_reply(reply_to, [req_id] + encode_reply(codec, framed, rep))
+                    else:
+                        future = pool.submit(call_function, *call)
+                        future.add_done_callback(
+                            lambda f, reply_to=reply_to, req_id=req_id, codec=codec, framed=framed:
+                            on_done(reply_to, req_id, codec, framed, f)
+                        )
+                        in_flight += 1
+            elif not items and in_flight < self.capacity and not self.missed_heartbeat():
+                break  # Interrupted
+
+            self.send_heartbeat()
+
+        pool.shutdown(wait=False, cancel_futures=True)
+        self.poller.unregister(wake_recv)
+        wake_recv.close()
+        # Calls still running on the pool finish later and check wake_send under the lock
+        with wake_lock:
+            wake_send.close()
         self.destroy()
 
+    def handle_request(self, frames: list) -> list:
+        """
+        Decode request frames, run the function and return encoded reply frames
+
+        The reply uses the codec of the request. A request in a codec this
+        worker cannot decode gets a pickled error reply tagged CODEC_PICKLE.
+        """
+        codec, framed, call, rep = self.decode_request(frames)
+        if call is not None:
+            rep = call_function(*call)
+        return encode_reply(codec, framed, rep)
+
+    def decode_request(self, frames: list) -> tuple:
+        """
+        Decode request frames into (codec, framed, call, rep)
+
+        call is (func, args, kwargs) ready to run; if the request cannot be
+        served, call is None and rep holds the error reply. A batch request
+        becomes one call_batch call, whose result is the list of entries.
+        """
+        codec, framed = PickleCodec, len(frames) == 2
+        try:
+            if framed:
+                codec = get_codec(frames[0])
+            name, args, kwargs = codec.loads(frames[-1])
+            with self.lock:
+                if name == BATCH_REQUEST:
+                    # An unknown name fails only its own entry, not the whole batch
+                    calls = [(self.__functions.get(n) or partial(unknown_function, n), a, k) for n, a, k in args]
+                    func, args, kwargs = call_batch, (calls,), {"parallel": kwargs.get("parallel", False)}
+                else:
+                    func = self.__functions[name]
+        except Exception as e:  # noqa
+            return codec, framed, None, [False, traceback.format_exc()]
+        return codec, framed, (func, args, kwargs), None
+
     def register(self, func: Callable) -> None:
         """
         Register function
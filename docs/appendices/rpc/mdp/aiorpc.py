@@ -0,0 +1,335 @@
+"""asyncio Majordomo RPC client and worker, built on zmq.asyncio
+
+Wire compatible with RpcClient/RpcWorker: requests carry the same
+[request_id, (codec_id,) body] envelope and workers announce their
+capacity in READY, so async and threaded peers can share a broker.
+Replies resolve awaitables on the caller's event loop directly, without
+a background thread or callback.
+"""
+import asyncio
+import logging
+import time
+import traceback
+import uuid
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+import zmq
+import zmq.asyncio
+
+# local
+from . import MDP
+from .codec import PickleCodec, encode_reply, get_codec
+from .zhelpers import dump
+
+
+class RemoteException(Exception):
+    """Raised by AsyncRpcClient calls that failed on the worker"""
+
+    def __init__(self, value: Any):
+        self.__value = value
+
+    def __str__(self):
+        return self.__value
+
+
+class AsyncRpcClient(object):
+    """
+    Majordomo RPC client for asyncio
+
+    result = await client.method(*args, _rpc_service="echo", **kwargs)
+    """
+
+    timeout = None  # Default seconds to wait for a reply, None waits forever
+
+    def __init__(self, broker: str, verbose: bool = False, codec: str = "pickle"):
+        self.broker = broker
+        self.verbose = verbose
+        self.codec = get_codec(codec)  # 默认编码，单次调用可用_rpc_codec覆盖
+        self.ctx = zmq.asyncio.Context()
+        self.client = None
+        self.futures: Dict[bytes, asyncio.Future] = {}  # request id -> Future
+        self.recv_task = None
+        self.active = False
+
+    async def start(self) -> None:
+        """Connect and start receiving replies on the running loop"""
+        if self.active:
+            return
+        self.client = self.ctx.socket(zmq.DEALER)
+        self.client.linger = 0
+        self.client.connect(self.broker)
+        self.active = True
+        self.recv_task = asyncio.get_running_loop().create_task(self.run())
+        if self.verbose:
+            logging.info("I: connecting to broker at %s...", self.broker)
+
+    @lru_cache(128)
+    def __getattr__(self, name: str):
+        # 执行远程调用任务
+        async def dorpc(*args, **kwargs):
+            if not self.active:
+                raise RuntimeError("AsyncRpcClient is not started")
+
+            assert "_rpc_service" in kwargs, "miss _rpc_service"
+            service = kwargs.pop('_rpc_service')
+            if isinstance(service, str):
+                service = service.encode()
+            _rpc_codec = kwargs.pop('_rpc_codec', None)
+            timeout = kwargs.pop('_rpc_timeout', self.timeout)
+            codec = self.codec if _rpc_codec is None else get_codec(_rpc_codec)
+
+            # 生成请求，非pickle编码在请求体前附加编码帧
+            request = [codec.dumps([name, args, kwargs])]
+            if codec is not PickleCodec:
+                request = [codec.id] + request
+
+            request_id = uuid.uuid4().hex.encode()
+            future = asyncio.get_running_loop().create_future()
+            self.futures[request_id] = future
+            try:
+                msg = [b'', MDP.C_CLIENT, service, request_id] + request
+                if self.verbose:
+                    logging.info(f"I: send request {request_id} to '{service}' service: ")
+                    dump(msg)
+                await self.client.send_multipart(msg)
+                ok, result = await asyncio.wait_for(future, timeout)
+            finally:
+                # 超时或取消后迟到的回复会被丢弃
+                self.futures.pop(request_id, None)
+
+            if not ok:
+                raise RemoteException(result)
+            return result
+
+        return dorpc
+
+    async def run(self) -> None:
+        """Resolve pending calls as their replies arrive"""
+        while self.active:
+            try:
+                msg = await self.client.recv_multipart()
+            except (asyncio.CancelledError, zmq.ContextTerminated):
+                break
+            if self.verbose:
+                logging.info("I: received reply:")
+                dump(msg)
+
+            if len(msg) < 5 or MDP.C_CLIENT != msg[1]:
+                logging.error("E: invalid reply:")
+                dump(msg)
+                continue
+
+            request_id, *frames = msg[3:]
+            future = self.futures.get(request_id)
+            if future is None or future.done():
+                continue  # Caller already gave up
+
+            try:
+                if len(frames) == 2:
+                    rep = get_codec(frames[0]).loads(frames[1])
+                else:
+                    rep = PickleCodec.loads(frames[0])
+            except Exception as e:  # noqa
+                future.set_exception(e)
+            else:
+                future.set_result(rep)
+
+    async def stop(self) -> None:
+        """Stop receiving, fail outstanding calls and close the socket"""
+        if not self.active:
+            return
+        self.active = False
+
+        if self.recv_task:
+            self.recv_task.cancel()
+            try:
+                await self.recv_task
+            except asyncio.CancelledError:
+                pass
+            self.recv_task = None
+
+        for future in self.futures.values():
+            if not future.done():
+                future.set_exception(ConnectionError("AsyncRpcClient stopped"))
+        self.futures.clear()
+
+        self.client.close()
+        self.ctx.term()
+
+
+class AsyncRpcWorker(object):
+    """
+    Majordomo RPC worker for asyncio
+
+    Registered coroutine functions are awaited, up to max_in_flight at a
+    time; plain functions are called inline on the loop, so they should be
+    quick. Liveness is only counted down while we have spare capacity,
+    since the broker does not heartbeat fully busy workers.
+    """
+
+    HEARTBEAT_LIVENESS = 3  # 3-5 is reasonable
+    heartbeat = 2500  # Heartbeat delay, msecs
+    reconnect = 2500  # Reconnect delay, msecs
+
+    def __init__(
+            self,
+            broker: str | int,
+            service: str | bytes,
+            verbose: bool = False,
+            max_in_flight: int = 16
+    ):
+        if isinstance(broker, int):
+            broker = f"tcp://localhost:{broker}"
+        if isinstance(service, str):
+            service = service.encode()
+        self.broker = broker
+        self.service = service
+        self.verbose = verbose
+        self.capacity = max(1, max_in_flight)
+        self.ctx = zmq.asyncio.Context()
+        self.worker = None
+        self.liveness = 0
+        self.heartbeat_at = 0
+        self.designated = False
+        self.active = False
+        self.tasks = set()  # Requests being served
+        self.__functions: Dict[str, Any] = {}
+
+    def register(self, func: Callable) -> None:
+        """
+        Register function
+        """
+        return self._register(func.__name__, func)
+
+    def _register(self, name: str, func: Callable) -> None:
+        """
+        Register function
+        """
+        self.__functions[name] = func
+
+    def is_designated(self) -> bool:
+        return self.designated
+
+    async def reconnect_to_broker(self) -> None:
+        """Connect or reconnect to broker"""
+        if self.worker:
+            self.worker.close()
+        self.worker = self.ctx.socket(zmq.DEALER)
+        self.worker.linger = 0
+        self.worker.connect(self.broker)
+        if self.verbose:
+            logging.info("I: connecting to broker at %s...", self.broker)
+
+        # Register service with broker, announcing capacity if above one
+        capacity = [str(self.capacity).encode()] if self.capacity > 1 else []
+        await self.send_to_broker(MDP.W_READY, [self.service] + capacity)
+
+        # If liveness hits zero, queue is considered disconnected
+        self.liveness = self.HEARTBEAT_LIVENESS
+        self.heartbeat_at = time.time() + 1e-3 * self.heartbeat
+
+    async def send_to_broker(self, command: bytes, msg: list = None) -> None:
+        msg = [b'', MDP.W_WORKER, command] + (msg or [])
+        if self.verbose:
+            logging.info("I: sending %s to broker", command)
+            dump(msg)
+        await self.worker.send_multipart(msg)
+
+    async def run(self) -> None:
+        """Serve requests until stop() is called"""
+        self.active = True
+        await self.reconnect_to_broker()
+
+        while self.active:
+            try:
+                events = await self.worker.poll(self.heartbeat)
+            except asyncio.CancelledError:
+                break
+
+            if events:
+                await self.process_message(await self.worker.recv_multipart())
+            elif len(self.tasks) < self.capacity:
+                self.liveness -= 1
+                if self.liveness == 0:
+                    if self.verbose:
+                        logging.warning("W: disconnected from broker - retrying...")
+                    await asyncio.sleep(1e-3 * self.reconnect)
+                    await self.reconnect_to_broker()
+
+            if time.time() > self.heartbeat_at:
+                await self.send_to_broker(MDP.W_HEARTBEAT)
+                self.heartbeat_at = time.time() + 1e-3 * self.heartbeat
+
+        await self.close()
+
+    async def process_message(self, msg: list) -> None:
+        """Handle one message from the broker, starting a task for requests."""
+        if self.verbose:
+            logging.info("I: received message from broker: ")
+            dump(msg)
+
+        self.liveness = self.HEARTBEAT_LIVENESS
+        if len(msg) < 3 or msg[0] != b'' or msg[1] != MDP.W_WORKER:
+            logging.error("E: invalid input message: ")
+            dump(msg)
+            return
+
+        command = msg[2]
+        if command == MDP.W_REQUEST:
+            reply_to, empty, request_id, *frames = msg[3:]
+            task = asyncio.get_running_loop().create_task(self.serve(reply_to, request_id, frames))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        elif command == MDP.W_HEARTBEAT:
+            designated = len(msg) > 3
+            if designated != self.designated:
+                self.designated = designated
+                self.designate_switch()
+        elif command == MDP.W_DISCONNECT:
+            # Reconnect inline: run() is the only user of self.worker
+            await self.reconnect_to_broker()
+        else:
+            logging.error("E: invalid input message: ")
+            dump(msg)
+
+    async def serve(self, reply_to: bytes, request_id: bytes, frames: list) -> None:
+        """Run one request and send its reply in the codec of the request"""
+        codec, framed = PickleCodec, len(frames) == 2
+        try:
+            if framed:
+                codec = get_codec(frames[0])
+            name, args, kwargs = codec.loads(frames[-1])
+            func = self.__functions[name]
+            result = func(*args, **kwargs)
+            if asyncio.iscoroutine(result):
+                result = await result
+            rep = [True, result]
+        except Exception as e:  # noqa
+            rep = [False, traceback.format_exc()]
+
+        if self.active:
+            await self.send_to_broker(
+                MDP.W_REPLY, [reply_to, b'', request_id] + encode_reply(codec, framed, rep)
+            )
+
+    async def stop(self) -> None:
+        """
+        Stop AsyncRpcWorker, run() returns within one heartbeat interval
+        """
+        self.active = False
+
+    async def close(self) -> None:
+        """Cancel outstanding requests, disconnect and release the context"""
+        for task in list(self.tasks):
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.worker:
+            await self.send_to_broker(MDP.W_DISCONNECT)
+            self.worker.close()
+            self.worker = None
+        self.ctx.term()
+
+    def designate_switch(self):
+        raise NotImplementedError
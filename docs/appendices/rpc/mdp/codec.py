@@ -0,0 +1,95 @@
+"""Wire codecs for RpcClient/RpcWorker payloads.
+
+A request that is not pickled carries one extra frame before its body naming
+the codec, so the MDP envelope seen by the worker is
+[request_id, codec_id, body] instead of the legacy [request_id, body].
+The worker answers in the same shape and codec; pickle requests keep the
+legacy envelope so that old clients and workers interoperate.
+"""
+import json
+import pickle
+import traceback
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, the codec is only registered when it is installed
+    msgpack = None
+
+#  Codec ids, sent as a single frame
+CODEC_PICKLE    =   b"\001"
+CODEC_JSON      =   b"\002"
+CODEC_MSGPACK   =   b"\003"
+
+
+class PickleCodec(object):
+    """Python pickle, handles any picklable object"""
+    id = CODEC_PICKLE
+    name = "pickle"
+
+    @staticmethod
+    def dumps(obj):
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def loads(data):
+        return pickle.loads(data)
+
+
+class JsonCodec(object):
+    """UTF-8 JSON, readable from any language (tuples arrive as lists)"""
+    id = CODEC_JSON
+    name = "json"
+
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+
+class MsgpackCodec(object):
+    """MessagePack, compact binary encoding for numeric payloads"""
+    id = CODEC_MSGPACK
+    name = "msgpack"
+
+    @staticmethod
+    def dumps(obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    @staticmethod
+    def loads(data):
+        return msgpack.unpackb(data, raw=False)
+
+
+codecs = {codec.id: codec for codec in (PickleCodec, JsonCodec)}
+if msgpack is not None:
+    codecs[MsgpackCodec.id] = MsgpackCodec
+
+codecs_by_name = {codec.name: codec for codec in codecs.values()}
+
+
+def get_codec(codec):
+    """Look up a codec by name, id frame or codec class"""
+    if isinstance(codec, str):
+        found = codecs_by_name.get(codec)
+    elif isinstance(codec, bytes):
+        found = codecs.get(codec)
+    else:
+        found = codec if codec in codecs.values() else None
+    if found is None:
+        raise ValueError(f"unsupported codec: {codec!r}")
+    return found
+
+
+def encode_reply(codec, framed, rep):
+    """Encode an [ok, result] reply in the codec of its request, as reply frames"""
+    try:
+        data = codec.dumps(rep)
+    except Exception as e:  # noqa 结果无法用该编码序列化
+        data = codec.dumps([False, traceback.format_exc()])
+
+    if framed:
+        return [codec.id, data]
+    return [data]
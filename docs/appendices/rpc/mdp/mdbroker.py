@@ -6,10 +6,12 @@ Author: Min RK <benjaminrk@gmail.com>
 Based on Java example by Arkadiusz Orzechowski
 """
 import datetime
+import heapq
 import logging
 import sys
 import time
 from binascii import hexlify
+from collections import OrderedDict, deque
 import pickle
 import zmq
 
@@ -21,16 +23,16 @@ from .zhelpers import dump
 class Service(object):
     """a single Service"""
     name = None  # Service name
-    requests = None  # List of client requests
-    waiting = None  # List of waiting workers
+    requests = None  # Queue of client requests
+    waiting = None  # Waiting workers, identity -> Worker in arrival order
     last_activity_time = None  # Time of last activity
     workholic_mode = False  # 工作狂模式，即不断地分配任务给指定的worker
     designated_worker = None  # 指定的worker
 
     def __init__(self, name):
         self.name = name
-        self.requests = []
-        self.waiting = []
+        self.requests = deque()
+        self.waiting = OrderedDict()
         # TODO: 根据服务名判断是否为workholic_mode,
         #  默认除APP服务以外都是workholic_mode，
         #  后续可以根据需求修改
@@ -45,11 +47,15 @@ class Worker(object):
     address = None  # Address to route to
     service = None  # Owning service, if known
     expiry = None  # expires at this point, unless heartbeat
+    capacity = 1  # requests the worker runs concurrently, announced in READY
+    in_flight = 0  # requests sent and not yet replied
 
     def __init__(self, identity, address, lifetime):
         self.identity = identity
         self.address = address
         self.expiry = time.time() + 1e-3 * lifetime
+        self.capacity = 1
+        self.in_flight = 0
 
 
 class MajorDomoBroker(object):
@@ -64,6 +70,7 @@ class MajorDomoBroker(object):
     HEARTBEAT_INTERVAL = 1000  # msecs
     HEARTBEAT_EXPIRY = HEARTBEAT_INTERVAL * HEARTBEAT_LIVENESS
     SERVICE_TIMEOUT = 5000  # 服务超时时间，单位为毫秒
+    DRAIN_BUDGET = 100  # 每次poll唤醒后最多连续读取的消息数，1即逐条处理
 
     # ---------------------------------------------------------------------
 
@@ -75,23 +82,26 @@ class MajorDomoBroker(object):
     service_timeout_at = None  # When to check for service timeouts
     services = None  # known services
     workers = None  # known workers
-    waiting = None  # idle workers
+    waiting = None  # idle workers, identity -> Worker in arrival order
+    expiry_heap = None  # (expiry, identity) min-heap of idle workers, stale entries skipped lazily
 
     verbose = False  # Print activity to stdout
+    drain_budget = None  # Max messages read per wakeup before housekeeping
 
     # ---------------------------------------------------------------------
 
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, drain_budget=None, ctx=None):
         """Initialize broker state."""
         self.verbose = verbose
+        self.drain_budget = self.DRAIN_BUDGET if drain_budget is None else max(1, drain_budget)
         self.services = {}
         self.workers = {}
-        self.waiting = []
+        self.waiting = OrderedDict()
+        self.expiry_heap = []
         self.heartbeat_at = time.time() + 1e-3 * self.HEARTBEAT_INTERVAL
         self.service_timeout_at = time.time() + 1e-3 * self.SERVICE_TIMEOUT  # 初始化服务超时检查时间
-        self.ctx = zmq.Context()
-        self.socket = self.ctx.socket(zmq.ROUTER)
-        self.socket.linger = 0
+        self.ctx = ctx if ctx is not None else zmq.Context()
+        self.socket = self.create_socket()
         self.poller = zmq.Poller()
         self.poller.register(self.socket, zmq.POLLIN)
         if self.verbose:
@@ -101,6 +111,12 @@ class MajorDomoBroker(object):
 
     # ---------------------------------------------------------------------
 
+    def create_socket(self):
+        """Create the socket for clients & workers."""
+        socket = self.ctx.socket(zmq.ROUTER)
+        socket.linger = 0
+        return socket
+
     def mediate(self):
         """Main broker work happens here"""
         while True:
@@ -109,23 +125,13 @@ class MajorDomoBroker(object):
             except KeyboardInterrupt:
                 break  # Interrupted
             if items:
-                msg = self.socket.recv_multipart()
-                if self.verbose:
-                    logging.info("I: received message:")
-                    dump(msg)
-
-                sender = msg.pop(0)
-                empty = msg.pop(0)
-                assert empty == b''
-                header = msg.pop(0)
-
-                if C_CLIENT == header:
-                    self.process_client(sender, msg)
-                elif W_WORKER == header:
-                    self.process_worker(sender, msg)
-                else:
-                    logging.error("E: invalid message:")
-                    dump(msg)
+                # 一次唤醒内读空socket（不超过drain_budget条），再做定期维护
+                for _ in range(self.drain_budget):
+                    try:
+                        msg = self.socket.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    self.process_message(msg)
 
             self.purge_workers()
             self.send_heartbeats()
@@ -135,10 +141,29 @@ class MajorDomoBroker(object):
                 self.check_service_timeouts()
                 self.service_timeout_at = time.time() + 1e-3 * self.SERVICE_TIMEOUT
 
+    def process_message(self, msg):
+        """Route one message received on the broker socket."""
+        if self.verbose:
+            logging.info("I: received message:")
+            dump(msg)
+
+        sender = msg.pop(0)
+        empty = msg.pop(0)
+        assert empty == b''
+        header = msg.pop(0)
+
+        if C_CLIENT == header:
+            self.process_client(sender, msg)
+        elif W_WORKER == header:
+            self.process_worker(sender, msg)
+        else:
+            logging.error("E: invalid message:")
+            dump(msg)
+
     def destroy(self):
         """Disconnect all workers, destroy context."""
         while self.workers:
-            self.delete_worker(self.workers.values()[0], True)
+            self.delete_worker(next(iter(self.workers.values())), True)
         self.ctx.destroy(0)
 
     def process_client(self, sender, msg):
@@ -165,6 +190,8 @@ class MajorDomoBroker(object):
         if W_READY == command:
             assert len(msg) >= 1  # At least, a service name
             service = msg.pop(0)
+            if msg:  # Optional capacity frame
+                worker.capacity = max(1, int(msg.pop(0)))
             # Not first command in session or Reserved service name
             if worker_ready or service.startswith(self.INTERNAL_SERVICE_PREFIX):
                 self.delete_worker(worker, True)
@@ -183,13 +210,14 @@ class MajorDomoBroker(object):
                 empty = msg.pop(0)  # ?
                 msg = [client, b'', C_CLIENT, worker.service.name] + msg
                 self.socket.send_multipart(msg)
+                worker.in_flight = max(0, worker.in_flight - 1)
                 self.worker_waiting(worker)
             else:
                 self.delete_worker(worker, True)
 
         elif W_HEARTBEAT == command:
             if worker_ready:
-                worker.expiry = time.time() + 1e-3 * self.HEARTBEAT_EXPIRY
+                self.refresh_expiry(worker)
             else:
                 self.delete_worker(worker, True)
 
@@ -208,17 +236,15 @@ class MajorDomoBroker(object):
         if worker.service is not None:
             if worker.service:
                 logging.info(f"I: deleting worker: {worker.identity}, service: {worker.service.name.decode()}")
-            if worker in worker.service.waiting:
-                worker.service.waiting.remove(worker)
+            worker.service.waiting.pop(worker.identity, None)
             if worker.service.workholic_mode and worker.identity == worker.service.designated_worker:
-                worker.service.designated_worker = worker.service.waiting[0].identity if worker.service.waiting else None
+                worker.service.designated_worker = next(iter(worker.service.waiting), None)
                 logging.info(
                     f"I: designated worker for service {worker.service.name.decode()} is {worker.service.designated_worker}")
         if worker.identity in self.workers:
             self.workers.pop(worker.identity)
 
-        if worker in self.waiting:
-            self.waiting.remove(worker)
+        self.waiting.pop(worker.identity, None)
 
         # 判断是否需要删除服务
         if worker.service is not None and not worker.service.waiting:
@@ -314,27 +340,38 @@ class MajorDomoBroker(object):
     def send_heartbeats(self):
         """Send heartbeats to idle workers if it's time"""
         if time.time() > self.heartbeat_at:
-            for worker in self.waiting:
+            for worker in self.waiting.values():
                 # 通知指定的worker它是designated_worker
                 msg = b"designated" if worker.service.designated_worker == worker.identity else None
                 self.send_to_worker(worker, W_HEARTBEAT, None, msg)
 
             self.heartbeat_at = time.time() + 1e-3 * self.HEARTBEAT_INTERVAL
 
+    def refresh_expiry(self, worker):
+        """Push worker expiry forward and index it if the worker is idle."""
+        worker.expiry = time.time() + 1e-3 * self.HEARTBEAT_EXPIRY
+        if worker.identity in self.waiting:
+            heapq.heappush(self.expiry_heap, (worker.expiry, worker.identity))
+            # 高频收发时过期条目堆积，超过阈值则按等待列表重建
+            if len(self.expiry_heap) > 2 * len(self.waiting) + 64:
+                self.expiry_heap = [(w.expiry, w.identity) for w in self.waiting.values()]
+                heapq.heapify(self.expiry_heap)
+
     def purge_workers(self):
         """Look for & kill expired workers.
 
-        Workers are oldest to most recent, so we stop at the first alive worker.
+        The expiry heap is ordered oldest first, so we stop at the first entry
+        that has not expired. Entries of workers that left the waiting list or
+        refreshed their expiry since being pushed are stale and just dropped.
         """
-        self.waiting.sort(key=lambda w: w.expiry)
-
-        while self.waiting:
-            w = self.waiting[0]
-            if w.expiry < time.time():
-                logging.info(f"I: deleting expired worker: {w.identity}")
-                self.delete_worker(w, False)
-            else:
-                break
+        now = time.time()
+        while self.expiry_heap and self.expiry_heap[0][0] < now:
+            expiry, identity = heapq.heappop(self.expiry_heap)
+            w = self.waiting.get(identity)
+            if w is None or w.expiry != expiry:
+                continue
+            logging.info(f"I: deleting expired worker: {w.identity}")
+            self.delete_worker(w, False)
 
     def worker_waiting(self, worker):
         """This worker is now waiting for work."""
@@ -345,9 +382,9 @@ class MajorDomoBroker(object):
                 f"I: designated worker for service {worker.service.name.decode()} is {worker.identity}")
 
         # Queue to broker and service waiting lists
-        self.waiting.append(worker)
-        worker.service.waiting.append(worker)
-        worker.expiry = time.time() + 1e-3 * self.HEARTBEAT_EXPIRY
+        self.waiting[worker.identity] = worker
+        worker.service.waiting[worker.identity] = worker
+        self.refresh_expiry(worker)
         self.dispatch(worker.service, None)
 
     def dispatch(self, service, msg):
@@ -357,33 +394,34 @@ class MajorDomoBroker(object):
             service.requests.append(msg)
         self.purge_workers()
         if service.workholic_mode and service.requests:
-            # 如果处于workholic_mode，尝试只向designated_worker分配任务
-            if service.designated_worker and service.designated_worker in self.workers:
-                # 检查designated_worker是否在等待列表中
-                if any(worker.identity == service.designated_worker for worker in service.waiting):
-                    # 如果designated_worker可用，直接分配
-                    designated_worker = next(
-                        worker for worker in service.waiting if worker.identity == service.designated_worker)
-                    service.waiting.remove(designated_worker)
-                    msg = service.requests.pop(0)
-                    self.waiting.remove(designated_worker)
-                    self.send_to_worker(designated_worker, W_REQUEST, None, msg)
-                # 如果designated_worker不在等待列表中但仍在线，不分配任务
-            else:
-                # 如果designated_worker不在线，选择另一个worker作为designated_worker
-                if service.requests and service.waiting:  # 确保有请求和等待的worker
-                    worker = service.waiting.pop(0)
-                    msg = service.requests.pop(0)
-                    self.waiting.remove(worker)
-                    service.designated_worker = worker.identity  # 更新designated_worker
-                    self.send_to_worker(worker, W_REQUEST, None, msg)
+            # 如果designated_worker不在线，选择另一个等待中的worker作为designated_worker
+            if not (service.designated_worker and service.designated_worker in self.workers) and service.waiting:
+                service.designated_worker = next(iter(service.waiting))  # 更新designated_worker
+            # 处于workholic_mode，只向designated_worker分配任务，直到其没有空闲容量
+            # 如果designated_worker不在等待列表中但仍在线，不分配任务
+            designated_worker = service.waiting.get(service.designated_worker)
+            while designated_worker is not None and service.requests:
+                self.assign(service, designated_worker, service.requests.popleft())
+                designated_worker = service.waiting.get(service.designated_worker)
         else:
             # 原有的分配逻辑
             while service.waiting and service.requests:
-                msg = service.requests.pop(0)
-                worker = service.waiting.pop(0)
-                self.waiting.remove(worker)
-                self.send_to_worker(worker, W_REQUEST, None, msg)
+                worker = next(iter(service.waiting.values()))
+                self.assign(service, worker, service.requests.popleft())
+
+    def assign(self, service, worker, msg):
+        """Send a request to a waiting worker.
+
+        The worker stays in the waiting lists, at the back, while it has
+        spare capacity, and leaves them once it is fully busy.
+        """
+        worker.in_flight += 1
+        if worker.in_flight >= worker.capacity:
+            service.waiting.pop(worker.identity, None)
+            self.waiting.pop(worker.identity, None)
+        else:
+            service.waiting.move_to_end(worker.identity)
+        self.send_to_worker(worker, W_REQUEST, None, msg)
 
     def send_to_worker(self, worker, command, option, msg=None):
         """Send message to worker.
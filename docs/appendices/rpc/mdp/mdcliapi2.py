@@ -12,7 +12,7 @@ import uuid  # 引入uuid模块
 import zmq
 
 from . import MDP
-from .zhelpers import dump
+from .zhelpers import dump, zpipe
 import queue
 import threading
 
@@ -26,8 +26,10 @@ class MajorDomoClient(object):
     ctx = None
     client = None
     poller = None
-    timeout = 1
+    timeout = 1000  # poller timeout, msecs; sends and stop wake the poller immediately
     verbose = False
+    wake_recv = None  # inproc pipe signalled when requests are queued
+    wake_send = None
 
     def __init__(self, broker, verbose=False):
         self.broker = broker
@@ -36,6 +38,9 @@ class MajorDomoClient(object):
         self.poller = zmq.Poller()
         self.lock = threading.Lock()
         self.queue: queue.Queue = queue.Queue()
+        self.wake_lock = threading.Lock()
+        self.wake_recv, self.wake_send = zpipe(self.ctx)
+        self.poller.register(self.wake_recv, zmq.POLLIN)
         # self.thread = threading.Thread(target=self._process_queue)
         # self.thread.start()
 
@@ -71,8 +76,19 @@ class MajorDomoClient(object):
             dump(request)
 
         self.queue.put(request)
+        self.wake()
         return request_id.decode()
 
+    def wake(self):
+        """Wake the thread polling in recv(); may be called from any thread."""
+        with self.wake_lock:
+            if self.wake_send.closed:
+                return  # close() already ran, nothing is polling
+            try:
+                self.wake_send.send(b"", zmq.NOBLOCK)
+            except zmq.Again:
+                pass  # A wakeup is already pending (pipe hwm is 1)
+
     # def _process_queue(self):
     #     while True:
     #         try:
@@ -85,11 +101,16 @@ class MajorDomoClient(object):
     def recv(self):
         """Returns the reply message or None if there was no reply, and removes the request from the tracking dictionary."""
         try:
-            items = self.poller.poll(self.timeout)
+            items = dict(self.poller.poll(self.timeout))
         except KeyboardInterrupt:
             return  # interrupted
 
-        if items:
+        if self.wake_recv in items:
+            # Requests were queued, return so the caller can send them
+            while self.wake_recv.poll(0):
+                self.wake_recv.recv()
+
+        if self.client in items:
             msg = self.client.recv_multipart()
             if self.verbose:
                 logging.info("I: received reply:")
@@ -115,4 +136,7 @@ class MajorDomoClient(object):
         if self.client:
             # self.poller.unregister(self.client)
             self.client.close()
+            with self.wake_lock:
+                self.wake_send.close()
+            self.wake_recv.close()
             self.ctx.term()
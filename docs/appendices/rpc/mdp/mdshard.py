@@ -0,0 +1,209 @@
+"""
+Sharded Majordomo Protocol broker
+
+One ROUTER frontend accepts every client and worker connection and forwards
+each message over an inproc PAIR to the dispatcher thread owning its service.
+Services are hash-partitioned across shards; each shard is a full
+MajorDomoBroker with its own Service and Worker tables, so a busy or slow
+service only stalls the shard it lives on.
+
+Shards are threads in one process and share the GIL: sharding isolates
+services from each other's queues, but does not add CPU parallelism.
+"""
+import logging
+import sys
+import threading
+import zlib
+
+import zmq
+
+# local
+from .MDP import *
+from .mdbroker import MajorDomoBroker
+from .zhelpers import dump
+
+# Control message from a shard: [SHARD_FORGET, worker address], sent when the
+# shard drops a worker the frontend did not see leave (e.g. heartbeat expiry)
+SHARD_FORGET = b"\x00forget"
+
+
+class BrokerShard(MajorDomoBroker):
+    """A MajorDomoBroker fed by the sharded frontend over an inproc pipe"""
+
+    endpoint = None  # inproc endpoint bound by the frontend
+
+    def __init__(self, endpoint, verbose=False, drain_budget=None, ctx=None):
+        self.endpoint = endpoint
+        super().__init__(verbose, drain_budget, ctx)
+
+    def create_socket(self):
+        """Messages keep their routing frame, so a PAIR can stand in for the ROUTER."""
+        socket = self.ctx.socket(zmq.PAIR)
+        socket.linger = 0
+        socket.connect(self.endpoint)
+        return socket
+
+    def run(self):
+        try:
+            self.mediate()
+        except zmq.ContextTerminated:
+            pass  # Frontend shut down
+
+    def delete_worker(self, worker, disconnect):
+        """Delete the worker and tell the frontend to forget its shard."""
+        super().delete_worker(worker, disconnect)
+        if not disconnect:
+            self.socket.send_multipart([SHARD_FORGET, worker.address])
+
+    def destroy(self):
+        """Disconnect all workers; the context belongs to the frontend."""
+        while self.workers:
+            self.delete_worker(next(iter(self.workers.values())), True)
+        self.socket.close()
+
+
+class ShardedMajorDomoBroker(object):
+    """
+    Majordomo Protocol broker with per-service dispatch shards
+    """
+
+    INTERNAL_SERVICE_PREFIX = MajorDomoBroker.INTERNAL_SERVICE_PREFIX
+    HEARTBEAT_INTERVAL = MajorDomoBroker.HEARTBEAT_INTERVAL  # msecs
+    DRAIN_BUDGET = MajorDomoBroker.DRAIN_BUDGET
+
+    # ---------------------------------------------------------------------
+
+    ctx = None  # Context shared with the shards (inproc)
+    socket = None  # Frontend socket for clients & workers
+    poller = None  # our Poller
+    shards = None  # BrokerShard per dispatcher thread
+    pipes = None  # Frontend end of each shard's inproc pipe
+    threads = None  # Dispatcher threads
+    worker_shards = None  # worker address -> shard index, learned from READY, dropped on disconnect or expiry
+
+    verbose = False  # Print activity to stdout
+
+    # ---------------------------------------------------------------------
+
+    def __init__(self, shards=4, verbose=False, drain_budget=None):
+        """Initialize frontend and shard state."""
+        assert shards >= 1
+        self.verbose = verbose
+        self.drain_budget = self.DRAIN_BUDGET if drain_budget is None else max(1, drain_budget)
+        self.ctx = zmq.Context()
+        self.socket = self.ctx.socket(zmq.ROUTER)
+        self.socket.linger = 0
+        self.poller = zmq.Poller()
+        self.poller.register(self.socket, zmq.POLLIN)
+        self.shards = []
+        self.pipes = []
+        self.threads = []
+        self.worker_shards = {}
+
+        for index in range(shards):
+            # inproc requires bind before connect
+            endpoint = f"inproc://mdshard-{id(self):x}-{index}"
+            pipe = self.ctx.socket(zmq.PAIR)
+            pipe.linger = 0
+            pipe.bind(endpoint)
+            self.pipes.append(pipe)
+            self.poller.register(pipe, zmq.POLLIN)
+            self.shards.append(BrokerShard(endpoint, verbose, drain_budget, self.ctx))
+
+    # ---------------------------------------------------------------------
+
+    bind = MajorDomoBroker.bind
+
+    def shard_for(self, key):
+        """Stable shard index for a service name (or any other bytes key)."""
+        return zlib.crc32(key) % len(self.shards)
+
+    def mediate(self):
+        """Start the dispatcher threads and pump messages between them and the frontend"""
+        for index, shard in enumerate(self.shards):
+            thread = threading.Thread(target=shard.run, name=f"mdshard-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        while True:
+            try:
+                items = dict(self.poller.poll(self.HEARTBEAT_INTERVAL))
+            except KeyboardInterrupt:
+                break  # Interrupted
+
+            if self.socket in items:
+                self.drain(self.socket, self.route_inbound)
+            for index, pipe in enumerate(self.pipes):
+                if pipe in items:
+                    self.drain(pipe, lambda msg, index=index: self.route_outbound(msg, index))
+
+    def drain(self, socket, handler):
+        for _ in range(self.drain_budget):
+            try:
+                msg = socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            handler(msg)
+
+    def route_inbound(self, msg):
+        """Forward a client or worker message to the shard owning its service."""
+        if self.verbose:
+            logging.info("I: received message:")
+            dump(msg)
+
+        if len(msg) < 4:
+            logging.error("E: invalid message:")
+            dump(msg)
+            return
+
+        sender, header = msg[0], msg[2]
+        if C_CLIENT == header:
+            service = msg[3]
+            # mmi.service asks about the service named in the body
+            key = msg[-1] if service.startswith(self.INTERNAL_SERVICE_PREFIX) else service
+            index = self.shard_for(key)
+        elif W_WORKER == header:
+            command = msg[3]
+            if W_READY == command and len(msg) > 4:
+                index = self.shard_for(msg[4])
+                self.worker_shards[sender] = index
+            else:
+                # Unknown workers still go to a shard, which disconnects them
+                index = self.worker_shards.get(sender)
+                if index is None:
+                    index = self.shard_for(sender)
+                if W_DISCONNECT == command:
+                    self.worker_shards.pop(sender, None)
+        else:
+            logging.error("E: invalid message:")
+            dump(msg)
+            return
+
+        self.pipes[index].send_multipart(msg)
+
+    def route_outbound(self, msg, index):
+        """Send a shard's reply, request or heartbeat out through the frontend."""
+        if msg[0] == SHARD_FORGET:
+            # Keep the entry if the worker has since announced itself to another shard
+            if self.worker_shards.get(msg[1]) == index:
+                del self.worker_shards[msg[1]]
+            return
+        if len(msg) >= 4 and W_WORKER == msg[2] and W_DISCONNECT == msg[3]:
+            self.worker_shards.pop(msg[0], None)
+        self.socket.send_multipart(msg)
+
+    def destroy(self):
+        """Destroy context, which also stops the dispatcher threads."""
+        self.ctx.destroy(0)
+
+
+def main():
+    """create and start new sharded broker"""
+    verbose = '-v' in sys.argv
+    broker = ShardedMajorDomoBroker(verbose=verbose)
+    broker.bind("tcp://*:5555")
+    broker.mediate()
+
+
+if __name__ == '__main__':
+    main()
@@ -37,14 +37,16 @@ class MajorDomoWorker(object):
 
     timeout = 2500 # poller timeout
     verbose = False # Print activity to stdout
+    capacity = 1 # Requests we accept concurrently, announced to the broker
 
     # Return address, if any
     reply_to = None
 
-    def __init__(self, broker, service, verbose=False):
+    def __init__(self, broker, service, verbose=False, capacity=1):
         self.broker = broker
         self.service = service
         self.verbose = verbose
+        self.capacity = capacity
         self.ctx = zmq.Context()
         self.poller = zmq.Poller()
         self.lock = threading.Lock()
@@ -71,8 +73,9 @@ class MajorDomoWorker(object):
         if self.verbose:
             logging.info("I: connecting to broker at %s...", self.broker)
 
-            # Register service with broker
-        self.send_to_broker(MDP.W_READY, self.service, [])
+            # Register service with broker, announcing capacity if above one
+        capacity = [str(self.capacity).encode()] if self.capacity > 1 else []
+        self.send_to_broker(MDP.W_READY, self.service, capacity)
 
         # If liveness hits zero, queue is considered disconnected
         self.liveness = self.HEARTBEAT_LIVENESS
@@ -111,6 +114,10 @@ class MajorDomoWorker(object):
         with self.lock:
             self.worker.send_multipart(msg)
 
+    def send_reply(self, reply_to, reply):
+        """Send a reply to the client at reply_to through the broker."""
+        self.send_to_broker(MDP.W_REPLY, msg=[reply_to, b''] + reply)
+
     def recv(self, reply=None):
         """Send reply, if any, to broker and wait for next request."""
         # Format and send the reply if we were provided one
@@ -118,8 +125,7 @@ class MajorDomoWorker(object):
 
         if reply is not None:
             assert self.reply_to is not None
-            reply = [self.reply_to, b''] + reply
-            self.send_to_broker(MDP.W_REPLY, msg=reply)
+            self.send_reply(self.reply_to, reply)
 
         self.expect_reply = True
 
@@ -131,60 +137,81 @@ class MajorDomoWorker(object):
                 break # Interrupted
 
             if items:
-                msg = self.worker.recv_multipart()
-                if self.verbose:
-                    logging.info("I: received message from broker: ")
-                    dump(msg)
-
-                self.liveness = self.HEARTBEAT_LIVENESS
-                # Don't try to handle errors, just assert noisily
-                assert len(msg) >= 3
-
-                empty = msg.pop(0)
-                assert empty == b''
-
-                header = msg.pop(0)
-                assert header == MDP.W_WORKER
-
-                command = msg.pop(0)
-                if command == MDP.W_REQUEST:
-                    # We should pop and save as many addresses as there are
-                    # up to a null part, but for now, just save one...
-                    self.reply_to = msg.pop(0)
-                    # pop empty
-                    empty = msg.pop(0)
-                    assert empty == b''
-
+                request = self.process_message(self.worker.recv_multipart())
+                if request is not None:
+                    self.reply_to, msg = request
                     return msg  # We have a request to process
-                elif command == MDP.W_HEARTBEAT:
-                    if (msg and not self.designated) or (not msg and self.designated):
-                        self.designated = not self.designated
-                        self.designate_switch()
-                        # print(f"{datetime.datetime.now()} designated: {self.designated}")
-                elif command == MDP.W_DISCONNECT:
-                    self.reconnect_to_broker()
-                else:
-                    logging.error("E: invalid input message: ")
-                    dump(msg)
-            else:
-                self.liveness -= 1
-                if self.liveness == 0:
-                    if self.verbose:
-                        logging.warn("W: disconnected from broker - retrying...")
-                    try:
-                        time.sleep(1e-3*self.reconnect)
-                    except KeyboardInterrupt:
-                        break
-                    self.reconnect_to_broker()
-
-            # Send HEARTBEAT if it's time
-            if time.time() > self.heartbeat_at:
-                self.send_to_broker(MDP.W_HEARTBEAT)
-                self.heartbeat_at = time.time() + 1e-3*self.heartbeat
+            elif not self.missed_heartbeat():
+                break # Interrupted
+
+            self.send_heartbeat()
 
         logging.warn("W: interrupt received, killing worker...")
         return None
 
+    def process_message(self, msg):
+        """Handle one message from the broker.
+
+        Returns (reply_to, request) for a request, None for anything else.
+        """
+        if self.verbose:
+            logging.info("I: received message from broker: ")
+            dump(msg)
+
+        self.liveness = self.HEARTBEAT_LIVENESS
+        # Don't try to handle errors, just assert noisily
+        assert len(msg) >= 3
+
+        empty = msg.pop(0)
+        assert empty == b''
+
+        header = msg.pop(0)
+        assert header == MDP.W_WORKER
+
+        command = msg.pop(0)
+        if command == MDP.W_REQUEST:
+            # We should pop and save as many addresses as there are
+            # up to a null part, but for now, just save one...
+            reply_to = msg.pop(0)
+            # pop empty
+            empty = msg.pop(0)
+            assert empty == b''
+
+            return reply_to, msg
+        elif command == MDP.W_HEARTBEAT:
+            if (msg and not self.designated) or (not msg and self.designated):
+                self.designated = not self.designated
+                self.designate_switch()
+                # print(f"{datetime.datetime.now()} designated: {self.designated}")
+        elif command == MDP.W_DISCONNECT:
+            self.reconnect_to_broker()
+        else:
+            logging.error("E: invalid input message: ")
+            dump(msg)
+        return None
+
+    def missed_heartbeat(self):
+        """Count a poll without broker traffic, reconnecting once liveness runs out.
+
+        Returns False if interrupted while waiting to reconnect.
+        """
+        self.liveness -= 1
+        if self.liveness == 0:
+            if self.verbose:
+                logging.warn("W: disconnected from broker - retrying...")
+            try:
+                time.sleep(1e-3*self.reconnect)
+            except KeyboardInterrupt:
+                return False
+            self.reconnect_to_broker()
+        return True
+
+    def send_heartbeat(self):
+        """Send HEARTBEAT if it's time"""
+        if time.time() > self.heartbeat_at:
+            self.send_to_broker(MDP.W_HEARTBEAT)
+            self.heartbeat_at = time.time() + 1e-3*self.heartbeat
+
     def destroy(self):
         # context.destroy depends on pyzmq >= 2.1.10
         self.ctx.destroy(0)